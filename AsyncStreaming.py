@@ -0,0 +1,155 @@
+import asyncio
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from StirlingCounts import getFlatStirlingSubtreeSizes
+from TypeBCounts import getTypeBSubtreeSizes
+from Ranking import getFlatStirlingPermutationBatch, getTypeBPartitionBatch
+
+# Async generators that stream the flattened Stirling permutations and the type
+# B partitions in batches, for serving them from an asyncio application without
+# blocking its event loop.
+#
+# A batch is a range of ranks [rank, rank + count) of the generation order, so a
+# worker can produce it from the rank alone (see getFlatStirlingPermutationBatch()
+# and getTypeBPartitionBatch() in Ranking.py) and a client can page through a
+# level by giving start and stop ranks. The workers live in Ranking.py so that
+# worker processes do not have to import asyncio. Batches are computed in a
+# process pool. Only prefetch of them are in flight at any time, and a new one is
+# submitted only when one is handed out, so a slow consumer holds back the
+# workers instead of piling up results in memory.
+#
+# The first batch is small and is computed in a thread, so it does not wait for
+# the worker processes to start, and every later batch is twice as large as the
+# one before, up to max_batch. The first objects arrive after a few milliseconds
+# whatever the size of the level, and the pickling overhead per object drops
+# as the stream goes on.
+#
+# When the consumer stops early, close the stream (e.g. with
+# contextlib.aclosing()) so that batches that have not started are cancelled.
+# A process pool created by the stream is shut down when the stream ends. Pass
+# in a long lived executor to share the workers between streams.
+################################################################################
+
+"""
+Streams worker(rank, count, *args) for consecutive ranges of ranks covering
+[start, stop), as described at the top of the file.
+"""
+async def streamBatches(worker, args, start, stop, first_batch, max_batch, prefetch, executor):
+    loop = asyncio.get_running_loop()
+    owned = executor is None
+    if owned:
+        executor = ProcessPoolExecutor()
+    pending = deque()
+    rank = start
+    size = first_batch
+
+    def submit():
+        nonlocal rank, size
+        count = min(size, stop - rank)
+        # the first batch goes to the default thread pool of the loop
+        pool = None if rank == start else executor
+        pending.append(loop.run_in_executor(pool, worker, rank, count, *args))
+        rank += count
+        size = min(2 * size, max_batch)
+
+    try:
+        while rank < stop and len(pending) < prefetch:
+            submit()
+        while pending:
+            batch = await pending.popleft()
+            if rank < stop:
+                submit()
+            yield batch
+    finally:
+        for future in pending:
+            future.cancel()
+        if owned:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+"""
+Asynchronously generate lists of flattened Stirling permutations on k[n], in the
+order of generateFlatStirlingPermutations(n, k), from rank start up to (not
+including) rank stop, by default to the end of the level. first_batch,
+max_batch and prefetch control the batch sizes and the number of batches in
+flight, and executor is the process pool to use (a new one if None).
+"""
+async def streamFlatStirlingPermutations(n, k = 2, start = 0, stop = None, first_batch = 64, max_batch = 1 << 16, prefetch = 2, executor = None):
+    total = getFlatStirlingSubtreeSizes(n, k)[n-1][0] if n > 0 else 0
+    stop = total if stop is None else min(stop, total)
+    async for batch in streamBatches(getFlatStirlingPermutationBatch, (n, k), start, stop, first_batch, max_batch, prefetch, executor):
+        yield batch
+
+"""
+Asynchronously generate lists of type B partitions of {-n,...,n}, in the order of
+generateTypeBPartitions(n), from rank start up to (not including) rank stop, in
+the same way as streamFlatStirlingPermutations().
+"""
+async def streamTypeBPartitions(n, start = 0, stop = None, first_batch = 64, max_batch = 1 << 16, prefetch = 2, executor = None):
+    total = getTypeBSubtreeSizes(n)[n][0]
+    stop = total if stop is None else min(stop, total)
+    async for batch in streamBatches(getTypeBPartitionBatch, (n,), start, stop, first_batch, max_batch, prefetch, executor):
+        yield batch
+
+
+if __name__ == "__main__":
+    import time
+    from contextlib import aclosing
+    from StirlingPermutations import getAllFlatStirlingPermutations
+    from TypeBPartitions import generateTypeBPartitions
+
+    async def collect(stream):
+        sizes = []
+        objects = []
+        async for batch in stream:
+            sizes.append(len(batch))
+            objects += batch
+        return sizes, objects
+
+    async def main():
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            perms = getAllFlatStirlingPermutations(7)
+            sizes, streamed = await collect(streamFlatStirlingPermutations(7, executor=executor))
+            assert streamed == perms
+            assert sizes[:4] == [64, 128, 256, 512]
+            # pages by rank
+            _, page = await collect(streamFlatStirlingPermutations(7, start=1000, stop=1100, first_batch=7, executor=executor))
+            assert page == perms[1000:1100]
+            _, streamed = await collect(streamFlatStirlingPermutations(4, 3, start=100, first_batch=1, max_batch=4, executor=executor))
+            assert streamed == getAllFlatStirlingPermutations(4, 3)[100:]
+            assert (await collect(streamFlatStirlingPermutations(0)))[1] == []
+
+            partitions = generateTypeBPartitions(6)
+            _, streamed = await collect(streamTypeBPartitions(6, executor=executor))
+            assert streamed == partitions
+            _, page = await collect(streamTypeBPartitions(6, start=5000, stop=6000, executor=executor))
+            assert page == partitions[5000:6000]
+            assert (await collect(streamTypeBPartitions(0)))[1] == [[([0], None)]]
+
+        # the first objects of a level far too large to enumerate come right away,
+        # and stopping early cancels the rest
+        for stream in (streamFlatStirlingPermutations(40, first_batch=16), streamTypeBPartitions(40, first_batch=16)):
+            start = time.perf_counter()
+            async with aclosing(stream) as batches:
+                async for batch in batches:
+                    first = time.perf_counter() - start
+                    break
+            assert len(batch) == 16
+            print(f"first batch after {1000 * first:.1f} ms, closed after {1000 * (time.perf_counter() - start):.1f} ms")
+
+        # the event loop keeps running while batches are computed
+        ticks = 0
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.001)
+        ticker = asyncio.create_task(tick())
+        count = 0
+        async for batch in streamFlatStirlingPermutations(8, max_batch=4096):
+            count += len(batch)
+            await asyncio.sleep(0)
+        ticker.cancel()
+        assert count == len(getAllFlatStirlingPermutations(8))
+        assert ticks > 10
+
+    asyncio.run(main())
@@ -0,0 +1,134 @@
+from itertools import chain
+import numpy as np
+from StirlingPermutations import generateFlatStirlingPermutations
+from StirlingCounts import countFlatStirlingPermutations
+
+# Run statistics for a whole level of words at once. A level is a 2D integer
+# array with one word per row (e.g. n_perms x k*n for the flattened Stirling
+# permutations on k[n]), using the same signed int letters as FastWord. Every
+# statistic is computed with a few vectorized passes over the array instead of
+# one Word per row.
+################################################################################
+
+"""
+Returns the flattened Stirling permutations on k[n] as a 2D array, one
+permutation per row in generation order, without building a list of lists.
+"""
+def getFlatStirlingLevelArray(n, k = 2, dtype = np.int32):
+    count = countFlatStirlingPermutations(n, k)
+    flat = np.fromiter(chain.from_iterable(generateFlatStirlingPermutations(n, k)), dtype=dtype, count=count * k * n)
+    return flat.reshape(count, k * n)
+
+"""
+Returns a boolean array where entry [r, i] is True if there is a descent between
+positions i and i+1 of row r.
+"""
+def getDescentMasks(level):
+    return level[:, :-1] > level[:, 1:]
+
+"""
+Returns a boolean array where entry [r, i] is True if a run of row r starts at
+position i.
+"""
+def getRunStartMasks(level):
+    starts = np.zeros(level.shape, dtype=bool)
+    if level.shape[1] > 0:
+        starts[:, 0] = True
+        starts[:, 1:] = getDescentMasks(level)
+    return starts
+
+"""
+Returns the number of runs of every row.
+"""
+def getRunCounts(level):
+    return getRunStartMasks(level).sum(axis=1)
+
+"""
+Returns the row, start position and length of every run in the level, ordered by
+row and then by position.
+"""
+def getRuns(level):
+    rows, starts = np.nonzero(getRunStartMasks(level))
+    # a run ends where the next run of the same row starts, or at the end
+    ends = np.full(len(starts), level.shape[1])
+    same_row = rows[1:] == rows[:-1]
+    ends[:-1][same_row] = starts[1:][same_row]
+    return rows, starts, ends - starts
+
+"""
+Returns the run types of every row as a 2D array, where row r holds the run
+lengths of row r of the level followed by zeros.
+"""
+def getRunLengthProfiles(level):
+    rows, _, lengths = getRuns(level)
+    counts = np.bincount(rows, minlength=level.shape[0])
+    profiles = np.zeros((level.shape[0], counts.max() if len(counts) else 0), dtype=np.int64)
+    # index of every run within its row
+    first_run = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    profiles[rows, np.arange(len(rows)) - first_run[rows]] = lengths
+    return profiles
+
+"""
+Returns a boolean array that is True for the rows whose runs have weakly
+increasing leading terms.
+"""
+def getFlatnessFlags(level):
+    rows, starts, _ = getRuns(level)
+    leaders = level[rows, starts]
+    drops = (leaders[1:] < leaders[:-1]) & (rows[1:] == rows[:-1])
+    return np.bincount(rows[1:][drops], minlength=level.shape[0]) == 0
+
+"""
+Returns a dictionary from run count to the array of rows with that many runs.
+Keys are in increasing order.
+"""
+def bucketByRunCount(level):
+    counts = getRunCounts(level)
+    return {int(runs): np.flatnonzero(counts == runs) for runs in np.unique(counts)}
+
+"""
+Returns a dictionary from run type to the array of flattened rows with that run
+type, using the same keys as getAllFlatStirlingPermutationsByRunType().
+"""
+def bucketByRunType(level):
+    flat_rows = np.flatnonzero(getFlatnessFlags(level))
+    profiles = getRunLengthProfiles(level)[flat_rows]
+    run_types, inverse = np.unique(profiles, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    buckets = {}
+    for index, run_type in enumerate(run_types):
+        key = ",".join([str(length) for length in run_type if length > 0])
+        buckets[key] = flat_rows[inverse == index]
+    return buckets
+
+
+if __name__ == "__main__":
+    from FlattenedWords import makeWord
+    from StirlingPermutations import generateStirlingPermutations, getAllFlatStirlingPermutationsByRunType
+
+    for k in range(1, 4):
+        for n in range(1, 7):
+            level = getFlatStirlingLevelArray(n, k)
+            perms = level.tolist()
+            words = [makeWord(perm) for perm in perms]
+            assert getRunCounts(level).tolist() == [word.getNumRuns() for word in words]
+            assert getFlatnessFlags(level).all()
+            for profile, word in zip(getRunLengthProfiles(level).tolist(), words):
+                assert [length for length in profile if length > 0] == word.getRunType()
+            by_run_count = {}
+            for index, word in enumerate(words):
+                by_run_count.setdefault(word.getNumRuns(), []).append(index)
+            assert {runs: rows.tolist() for runs, rows in bucketByRunCount(level).items()} == by_run_count
+            by_run_type = getAllFlatStirlingPermutationsByRunType(perms)
+            buckets = bucketByRunType(level)
+            assert set(buckets) == set(by_run_type)
+            for key, rows in buckets.items():
+                assert sorted([str(makeWord(perms[row])) for row in rows]) == by_run_type[key]
+
+    # non flat words and signed letters
+    for n in range(1, 6):
+        level = np.array(generateStirlingPermutations(n, False))
+        level[:, ::3] *= -1
+        words = [makeWord(row) for row in level.tolist()]
+        assert getFlatnessFlags(level).tolist() == [word.isFlattened() for word in words]
+        assert getRunCounts(level).tolist() == [word.getNumRuns() for word in words]
@@ -0,0 +1,200 @@
+import argparse
+import json
+import resource
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from FlattenedWords import makeWord
+from StirlingPermutations import generateStirlingPermutations, generateStirlingPermutationsByInsertion, generateFlatStirlingFamilies, generateFlatStirlingPermutationsByRunLength, getAllFlatStirlingPermutations, getAllFlatStirlingPermutations2, getTypeBPartition
+from TypeBPartitions import generateTypeBPartitions, getReducedRepresentation, getStirlingPermutation
+
+# Benchmarks of the generators and of the bijection pipeline.
+#
+# Every case runs in a fresh process, so the peak RSS it reports is its own. The
+# wall time is the best of a few repeats, and the peak of the memory allocated
+# by Python is measured in a separate run under tracemalloc, since tracing slows
+# everything down.
+#
+#   python Benchmarks.py --save baseline.json
+#   python Benchmarks.py --compare baseline.json --threshold 0.2
+#
+# --compare exits with status 1 if any case got slower or used more memory than
+# the baseline by more than the threshold.
+################################################################################
+
+"""
+Each benchmark takes the size parameters of a case and returns how many objects
+it produced.
+"""
+def benchStirlingPermutations(n):
+    return len(generateStirlingPermutations(n, False))
+
+def benchStirlingPermutationsByInsertion(n, k):
+    count = 0
+    for _ in generateStirlingPermutationsByInsertion(n, k):
+        count += 1
+    return count
+
+def benchFlatStirlingPermutations(n, k):
+    return len(getAllFlatStirlingPermutations(n, k))
+
+def benchFlatStirlingFamilies(n, k):
+    count = 0
+    for _, gaps, _, _ in generateFlatStirlingFamilies(n, k):
+        count += len(gaps)
+    return count
+
+def benchFlatStirlingPermutationsByRunLength(n, k):
+    count = 0
+    for _ in generateFlatStirlingPermutationsByRunLength(n, k):
+        count += 1
+    return count
+
+def benchFlatStirlingPermutations2(n):
+    return len(getAllFlatStirlingPermutations2(n))
+
+def benchTypeBPartitions(n):
+    return len(generateTypeBPartitions(n))
+
+def benchRoundTrip(n):
+    perms = getAllFlatStirlingPermutations(n)
+    for perm in perms:
+        assert getStirlingPermutation(getReducedRepresentation(getTypeBPartition(perm))) == perm
+    return len(perms)
+
+def benchWords(n):
+    perms = getAllFlatStirlingPermutations(n)
+    for perm in perms:
+        makeWord(perm)
+    return len(perms)
+
+"""
+Returns the list of (name, benchmark, parameters) of all the cases, smaller ones
+if quick is set.
+"""
+def getCases(quick = False):
+    # largest n of every benchmark, reduced by 2 for quick runs
+    shrink = 2 if quick else 0
+    cases = []
+    for n in range(3, 8 - shrink):
+        cases.append(("generateStirlingPermutations", benchStirlingPermutations, {"n": n}))
+    for k, max_n in ((2, 8), (3, 6)):
+        for n in range(3, max_n + 1 - shrink):
+            cases.append(("generateStirlingPermutationsByInsertion", benchStirlingPermutationsByInsertion, {"n": n, "k": k}))
+    for k, max_n in ((2, 9), (3, 7), (4, 6)):
+        for n in range(3, max_n + 1 - shrink):
+            cases.append(("getAllFlatStirlingPermutations", benchFlatStirlingPermutations, {"n": n, "k": k}))
+    for k, max_n in ((2, 10), (3, 8)):
+        for n in range(3, max_n + 1 - shrink):
+            cases.append(("generateFlatStirlingFamilies", benchFlatStirlingFamilies, {"n": n, "k": k}))
+    for k, max_n in ((2, 9), (10, 6), (30, 5)):
+        for n in range(3, max_n + 1 - shrink):
+            cases.append(("generateFlatStirlingPermutationsByRunLength", benchFlatStirlingPermutationsByRunLength, {"n": n, "k": k}))
+    for n in range(3, 8 - shrink):
+        cases.append(("getAllFlatStirlingPermutations2", benchFlatStirlingPermutations2, {"n": n}))
+    for n in range(3, 9 - shrink):
+        cases.append(("generateTypeBPartitions", benchTypeBPartitions, {"n": n}))
+    for n in range(3, 9 - shrink):
+        cases.append(("bijectionRoundTrip", benchRoundTrip, {"n": n}))
+    for n in range(3, 9 - shrink):
+        cases.append(("makeWord", benchWords, {"n": n}))
+    return cases
+
+"""
+Returns the key of a case in the results, e.g. "getAllFlatStirlingPermutations[n=5,k=2]".
+"""
+def getCaseKey(name, params):
+    return f"{name}[{','.join([f'{key}={value}' for key, value in params.items()])}]"
+
+"""
+Runs one case and returns its measurements. Runs in a worker process.
+"""
+def runCase(benchmark, params, repeats):
+    seconds = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        count = benchmark(**params)
+        elapsed = time.perf_counter() - start
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+
+    tracemalloc.start()
+    benchmark(**params)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        max_rss *= 1024
+    return {
+        "objects": count,
+        "seconds": seconds,
+        "objects_per_second": count / seconds if seconds > 0 else None,
+        "tracemalloc_peak": peak,
+        "max_rss": max_rss,
+    }
+
+"""
+Runs the cases and returns a dictionary from case key to measurements.
+"""
+def runBenchmarks(cases, repeats = 3, _print = False):
+    results = {}
+    context = get_context("spawn")
+    for name, benchmark, params in cases:
+        # a fresh process per case keeps the peak RSS of the cases apart
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            result = executor.submit(runCase, benchmark, params, repeats).result()
+        key = getCaseKey(name, params)
+        results[key] = result
+        if _print:
+            print(f"{key:50} {result['objects']:>10} objects {result['seconds']:>10.4f} s "
+                  f"{result['objects_per_second'] or 0:>12.0f} /s {result['tracemalloc_peak'] / 2**20:>9.1f} MiB traced "
+                  f"{result['max_rss'] / 2**20:>9.1f} MiB rss")
+    return results
+
+"""
+Returns a list of messages for every case that got slower, or allocated more, by
+more than threshold (a fraction) compared to the baseline. Cases missing from
+either side are skipped. Very short timings are too noisy to compare, so times
+under min_seconds in both runs are ignored.
+"""
+def findRegressions(results, baseline, threshold = 0.2, min_seconds = 0.01):
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        before = baseline[key]
+        if max(result["seconds"], before["seconds"]) >= min_seconds and result["seconds"] > (1 + threshold) * before["seconds"]:
+            regressions.append(f"{key}: {before['seconds']:.4f} s -> {result['seconds']:.4f} s")
+        if result["tracemalloc_peak"] > (1 + threshold) * before["tracemalloc_peak"]:
+            regressions.append(f"{key}: {before['tracemalloc_peak']} -> {result['tracemalloc_peak']} bytes traced")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the generators and the bijection.")
+    parser.add_argument("--quick", action="store_true", help="only run the smaller cases")
+    parser.add_argument("--only", nargs="*", help="only run the benchmarks with these names")
+    parser.add_argument("--repeats", type=int, default=3, help="timed runs per case, the best one counts")
+    parser.add_argument("--save", help="write the results as a JSON baseline to this file")
+    parser.add_argument("--compare", help="compare the results against this JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown as a fraction of the baseline")
+    args = parser.parse_args()
+
+    cases = [case for case in getCases(args.quick) if not args.only or case[0] in args.only]
+    results = runBenchmarks(cases, args.repeats, _print=True)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = findRegressions(results, baseline, args.threshold)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        if regressions:
+            sys.exit(1)
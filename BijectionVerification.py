@@ -0,0 +1,174 @@
+import hashlib
+from functools import partial
+from CompactEncoding import encodeFlatStirlingPermutation, encodeTypeBPartition
+from ParallelEnumeration import reduceFlatStirlingPermutations, reduceTypeBPartitions
+from StirlingPermutations import getTypeBPartition
+from TypeBPartitions import getReducedRepresentation, getStirlingPermutation, copyTypeBPartition
+from TypeBBijection import flatStirlingToTypeB, typeBToFlatStirling, typeBPartitionToReduced, reducedToTypeBPartition
+
+# Verification that the map from flattened Stirling permutations on 2[n+1] to
+# type B partitions of {-n,...,n} is a bijection, at sizes where nothing can be
+# printed or kept in memory.
+#
+# Both sides are streamed from their generators in shards across processes (see
+# ParallelEnumeration.py). Every object is sent through the map and back, and
+# must come back unchanged. On top of that, each side sums a 128 bit hash of the
+# compact code (see CompactEncoding.py) of every object and of every image. These
+# sums are fingerprints of multisets: if the images of all the permutations give
+# the same fingerprint as all the partitions, and the other way around, then
+# (but for a hash collision) every partition is hit exactly once, so the map is
+# injective and onto. The fingerprints are sums, so shards combine by adding.
+################################################################################
+
+FINGERPRINT_MODULUS = 1 << 128
+
+"""
+Returns the 128 bit hash of a code.
+"""
+def hashCode(code):
+    data = code.to_bytes(code.bit_length() // 8 + 1, "little")
+    return int.from_bytes(hashlib.blake2b(data, digest_size=16).digest(), "little")
+
+"""
+Returns the summary of an empty shard.
+count -> Number of objects checked.
+failures -> Number of objects that did not come back unchanged, or broke the map.
+examples -> The first few of those, as (object, image, object after the round trip
+            or the error).
+fingerprint -> Multiset fingerprint of the codes of the objects.
+image_fingerprint -> Multiset fingerprint of the codes of their images.
+"""
+def getEmptySummary():
+    return {"count": 0, "failures": 0, "examples": [], "fingerprint": 0, "image_fingerprint": 0}
+
+"""
+Combines the summaries of two shards, keeping the first max_examples examples.
+"""
+def combineVerificationSummaries(a, b, max_examples = 5):
+    return {
+        "count": a["count"] + b["count"],
+        "failures": a["failures"] + b["failures"],
+        "examples": (a["examples"] + b["examples"])[:max_examples],
+        "fingerprint": (a["fingerprint"] + b["fingerprint"]) % FINGERPRINT_MODULUS,
+        "image_fingerprint": (a["image_fingerprint"] + b["image_fingerprint"]) % FINGERPRINT_MODULUS,
+    }
+
+"""
+Mapper that checks flattened Stirling permutations on 2[n+1]. With fast set, the
+linear time functions of TypeBBijection.py are checked, otherwise the original
+ones.
+"""
+def verifyFlatStirlingPermutations(perms, fast = False, max_examples = 5):
+    summary = getEmptySummary()
+    fingerprint = 0
+    image_fingerprint = 0
+    for perm in perms:
+        summary["count"] += 1
+        fingerprint += hashCode(encodeFlatStirlingPermutation(perm))
+        reduced = None
+        try:
+            if fast:
+                reduced = flatStirlingToTypeB(perm)
+                partition = reducedToTypeBPartition(reduced)
+                back = typeBToFlatStirling(reduced)
+            else:
+                partition = getTypeBPartition(perm)
+                reduced = getReducedRepresentation(partition)
+                back = getStirlingPermutation(reduced)
+            image_fingerprint += hashCode(encodeTypeBPartition(partition))
+        except Exception as error:
+            back = repr(error)
+        if back != perm:
+            summary["failures"] += 1
+            if len(summary["examples"]) < max_examples:
+                summary["examples"].append((perm, reduced, back))
+    summary["fingerprint"] = fingerprint % FINGERPRINT_MODULUS
+    summary["image_fingerprint"] = image_fingerprint % FINGERPRINT_MODULUS
+    return summary
+
+"""
+Mapper that checks type B partitions of {-n,...,n}, by their reduced
+representations. With fast set, the linear time functions of TypeBBijection.py
+are checked, otherwise the original ones.
+"""
+def verifyTypeBPartitions(partitions, fast = False, max_examples = 5):
+    summary = getEmptySummary()
+    fingerprint = 0
+    image_fingerprint = 0
+    for partition in partitions:
+        summary["count"] += 1
+        fingerprint += hashCode(encodeTypeBPartition(partition))
+        perm = None
+        try:
+            if fast:
+                reduced = typeBPartitionToReduced(partition)
+                perm = typeBToFlatStirling(reduced)
+                back = flatStirlingToTypeB(perm)
+            else:
+                reduced = getReducedRepresentation(partition)
+                perm = getStirlingPermutation(reduced)
+                back = getReducedRepresentation(getTypeBPartition(perm))
+            image_fingerprint += hashCode(encodeFlatStirlingPermutation(perm))
+        except Exception as error:
+            reduced = None
+            back = repr(error)
+        if reduced is None or back != reduced:
+            summary["failures"] += 1
+            if len(summary["examples"]) < max_examples:
+                # partitions from the generator are reused, so keep a copy
+                summary["examples"].append((copyTypeBPartition(partition), perm, back))
+    summary["fingerprint"] = fingerprint % FINGERPRINT_MODULUS
+    summary["image_fingerprint"] = image_fingerprint % FINGERPRINT_MODULUS
+    return summary
+
+"""
+Checks the bijection between the flattened Stirling permutations on 2[n+1] and
+the type B partitions of {-n,...,n} in parallel, and returns a report with the
+summaries of both sides (see getEmptySummary()) and:
+counts_equal -> Both sides have the same number of objects.
+images_match -> The images of each side have the same fingerprint as the other
+            side.
+ok -> Everything came back unchanged, counts_equal and images_match.
+"""
+def verifyBijection(n, fast = False, max_examples = 5, max_workers = None):
+    reducer = partial(combineVerificationSummaries, max_examples=max_examples)
+    stirling = reduceFlatStirlingPermutations(n + 1, partial(verifyFlatStirlingPermutations, fast=fast, max_examples=max_examples), reducer=reducer, initial=getEmptySummary(), max_workers=max_workers)
+    type_b = reduceTypeBPartitions(n, partial(verifyTypeBPartitions, fast=fast, max_examples=max_examples), reducer=reducer, initial=getEmptySummary(), max_workers=max_workers)
+    counts_equal = stirling["count"] == type_b["count"]
+    images_match = stirling["image_fingerprint"] == type_b["fingerprint"] and type_b["image_fingerprint"] == stirling["fingerprint"]
+    return {
+        "n": n,
+        "stirling": stirling,
+        "type_b": type_b,
+        "counts_equal": counts_equal,
+        "images_match": images_match,
+        "ok": counts_equal and images_match and stirling["failures"] == 0 and type_b["failures"] == 0,
+    }
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    for n in range(0, 6):
+        for fast in (False, True):
+            report = verifyBijection(n, fast)
+            assert report["ok"], report
+
+    # a map that is not onto is caught by the fingerprints even though every
+    # round trip works
+    perms = [[1, 1, 2, 2, 3, 3], [1, 2, 2, 1, 3, 3]]
+    summary = verifyFlatStirlingPermutations(perms + perms)
+    assert summary["failures"] == 0
+    assert summary["image_fingerprint"] != verifyTypeBPartitions([getTypeBPartition(perm) for perm in perms])["fingerprint"]
+
+    # a broken round trip is reported with the object
+    summary = verifyFlatStirlingPermutations([[1, 2, 1, 2]])
+    assert summary["failures"] == 1 and summary["examples"][0][0] == [1, 2, 1, 2]
+
+    max_n = int(sys.argv[1]) if len(sys.argv) > 1 else 7
+    for n in range(6, max_n + 1):
+        start = time.perf_counter()
+        report = verifyBijection(n, fast=True)
+        print(f"n={n}: {report['stirling']['count']} objects per side, ok={report['ok']}, {time.perf_counter() - start:.1f} s")
+        assert report["ok"], report
@@ -0,0 +1,304 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+from CompactEncoding import FLAT_STIRLING, TYPE_B
+from StirlingPermutations import generateFlatStirlingPermutations
+from TypeBPartitions import iterateTypeBPartitions
+from TypeBBijection import typeBPartitionToReduced
+
+# Fixed width binary files of flattened Stirling permutations and reduced type B
+# partitions, for result sets too large to print.
+#
+# A file is a 32 byte header followed by count records of width values each:
+#   magic, kind, bytes per value, n, k, count
+# Values are little endian ints of 1, 2 or 4 bytes, the smallest that fits.
+#
+# Flattened Stirling permutation on k[n]: the k * n values of the permutation.
+#
+# Reduced type B partition of {-n,...,n}: for every 1 <= v <= n, the 1-based
+# index of the block of the reduced representation holding v or -v, negated if
+# it holds -v. The block of 0 is always block 1, so it is not stored.
+################################################################################
+
+HEADER = struct.Struct("<8sBBxxIIQ4x")
+MAGIC = b"STTBREC1"
+BUFFER_SIZE = 1 << 16
+
+"""
+Returns the number of bytes per value and the array/memoryview format for the
+records of a level.
+"""
+def getRecordFormat(kind, n):
+    signed = kind == TYPE_B
+    for itemsize, code in ((1, "b"), (2, "h"), (4, "i")):
+        # type B block indices go up to n + 1
+        if n + signed < 1 << (8 * itemsize - signed):
+            return itemsize, code if signed else code.upper()
+    raise ValueError(f"n = {n} is too large for the record format")
+
+"""
+Returns the number of values in every record of a level.
+"""
+def getRecordWidth(kind, n, k):
+    return k * n if kind == FLAT_STIRLING else n
+
+"""
+Returns the record of a reduced type B partition.
+"""
+def encodeTypeBRecord(reduced):
+    n = max([abs(x) for block in reduced for x in block])
+    record = (n + 1) * [0]
+    for index, block in enumerate(reduced, 1):
+        for x in block:
+            record[abs(x)] = index if x >= 0 else -index
+    return record[1:]
+
+"""
+Returns the reduced type B partition of a record.
+"""
+def decodeTypeBRecord(record):
+    negatives = [[]]
+    positives = [[0]]
+    for v, index in enumerate(record, 1):
+        if abs(index) > len(positives):
+            negatives.append([])
+            positives.append([])
+        if index < 0:
+            negatives[-index - 1].append(-v)
+        else:
+            positives[index - 1].append(v)
+    return [neg + pos for (neg, pos) in zip(negatives, positives)]
+
+"""
+Streaming writer of a record file, to be used as a context manager. Records are
+buffered and written in large chunks, and the count in the header is filled in
+when the writer is closed, and by sync(). If count is given, an existing file of
+the same level with at least that many records is continued: everything after
+the first count records (e.g. left over from an interrupted run) is dropped and
+new records are appended. Raises ValueError if there is no such file.
+self.count -> Number of records written so far.
+"""
+class RecordWriter:
+
+    def __init__(self, path, kind, n, k = 0, count = 0):
+        self.kind = kind
+        self.n = n
+        self.k = k
+        self.width = getRecordWidth(kind, n, k)
+        self.itemsize, self.format = getRecordFormat(kind, n)
+        self.count = count
+        self.buffer = array(self.format)
+        if count > 0:
+            if not os.path.exists(path):
+                raise ValueError(f"{path} does not exist, so its first {count} records can not be continued")
+            self.file = open(path, "r+b")
+            header = self.file.read(HEADER.size)
+            header = HEADER.unpack(header) if len(header) == HEADER.size else None
+            size = HEADER.size + count * self.width * self.itemsize
+            if header is None or header[:5] != (MAGIC, kind, self.itemsize, n, k) or header[5] < count or os.path.getsize(path) < size:
+                self.file.close()
+                raise ValueError(f"{path} does not hold the first {count} records of this level")
+            self.file.truncate(size)
+            self.file.seek(0, 2)
+        else:
+            self.file = open(path, "wb")
+            self.file.write(HEADER.size * b"\0")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    """
+    Writes a flattened Stirling permutation, or a reduced type B partition.
+    """
+    def write(self, obj):
+        self.buffer.extend(obj if self.kind == FLAT_STIRLING else encodeTypeBRecord(obj))
+        self.count += 1
+        if len(self.buffer) >= BUFFER_SIZE:
+            self.flush()
+
+    def writeAll(self, objects):
+        for obj in objects:
+            self.write(obj)
+
+    def flush(self):
+        if sys.byteorder == "big":
+            self.buffer.byteswap()
+        self.file.write(self.buffer.tobytes())
+        self.buffer = array(self.format)
+
+    """
+    Writes out everything written so far, with the count in the header, and waits
+    until it is on disk.
+    """
+    def sync(self):
+        self.flush()
+        self.writeHeader()
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def writeHeader(self):
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, self.kind, self.itemsize, self.n, self.k, self.count))
+        self.file.seek(0, 2)
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.flush()
+        self.writeHeader()
+        self.file.close()
+
+"""
+Zero copy reader of a record file, to be used as a context manager. The file is
+memory mapped and the records are exposed without reading them:
+self.values -> Flat memoryview over all the values.
+self.records -> The same memoryview with shape [count, width].
+Views assume a little endian machine; getArray() works on any machine.
+"""
+class RecordReader:
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        header = self.file.read(HEADER.size)
+        if len(header) != HEADER.size:
+            raise ValueError(f"{path} is not a record file")
+        magic, self.kind, self.itemsize, self.n, self.k, self.count = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a record file")
+        self.width = getRecordWidth(self.kind, self.n, self.k)
+        _, self.format = getRecordFormat(self.kind, self.n)
+        size = self.count * self.width * self.itemsize
+        if self.file.seek(0, 2) < HEADER.size + size:
+            raise ValueError(f"{path} is truncated")
+        if size == 0:
+            self.map = None
+            self.values = memoryview(b"").cast(self.format)
+        else:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.values = memoryview(self.map)[HEADER.size:HEADER.size + size].cast(self.format)
+        self.records = self.values.cast("B").cast(self.format, [self.count, self.width]) if self.width else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    """
+    Returns the values of record i as a list.
+    """
+    def getRecord(self, i):
+        return self.values[i * self.width:(i + 1) * self.width].tolist()
+
+    """
+    Returns the flattened Stirling permutation or the reduced type B partition
+    of record i.
+    """
+    def getObject(self, i):
+        record = self.getRecord(i)
+        return record if self.kind == FLAT_STIRLING else decodeTypeBRecord(record)
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self.getObject(i)
+
+    """
+    Returns the records as a NumPy array of shape (count, width) over the same
+    memory. The array has to be dropped before the reader is closed.
+    """
+    def getArray(self):
+        import numpy as np
+        dtype = np.dtype(f"<{'i' if self.kind == TYPE_B else 'u'}{self.itemsize}")
+        if self.map is None:
+            return np.zeros((self.count, self.width), dtype=dtype)
+        return np.frombuffer(self.map, dtype=dtype, count=self.count * self.width, offset=HEADER.size).reshape(self.count, self.width)
+
+    def close(self):
+        if self.records is not None:
+            self.records.release()
+        self.values.release()
+        if self.map is not None:
+            self.map.close()
+        self.file.close()
+
+"""
+Writes the flattened Stirling permutations on k[n] to path in generation order
+and returns how many there were.
+"""
+def writeFlatStirlingPermutations(path, n, k = 2):
+    with RecordWriter(path, FLAT_STIRLING, n, k) as writer:
+        writer.writeAll(generateFlatStirlingPermutations(n, k))
+    return writer.count
+
+"""
+Writes the reduced representations of the type B partitions of {-n,...,n} to
+path in generation order and returns how many there were.
+"""
+def writeTypeBPartitions(path, n):
+    with RecordWriter(path, TYPE_B, n) as writer:
+        writer.writeAll(typeBPartitionToReduced(partition) for partition in iterateTypeBPartitions(n))
+    return writer.count
+
+
+if __name__ == "__main__":
+    import os
+    import tempfile
+    from StirlingPermutations import getAllFlatStirlingPermutations
+    from TypeBPartitions import generateTypeBPartitions, getReducedRepresentation
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "level.bin")
+        for k in range(1, 4):
+            for n in range(0, 7):
+                perms = getAllFlatStirlingPermutations(n, k)
+                assert writeFlatStirlingPermutations(path, n, k) == len(perms)
+                with RecordReader(path) as reader:
+                    assert (reader.n, reader.k, len(reader)) == (n, k, len(perms))
+                    assert list(reader) == perms
+                    assert reader.getArray().tolist() == perms
+                    if n > 0:
+                        assert reader.records.tolist() == perms
+
+        for n in range(0, 7):
+            reduced = [getReducedRepresentation(partition) for partition in generateTypeBPartitions(n)]
+            assert writeTypeBPartitions(path, n) == len(reduced)
+            with RecordReader(path) as reader:
+                assert list(reader) == reduced
+                for i, red in enumerate(reduced):
+                    assert decodeTypeBRecord(encodeTypeBRecord(red)) == red
+                    assert reader.getArray()[i].tolist() == encodeTypeBRecord(red)
+
+        # continuing a file drops the records after count
+        with RecordWriter(path, FLAT_STIRLING, 3, 2) as writer:
+            writer.writeAll(getAllFlatStirlingPermutations(3))
+        with RecordWriter(path, FLAT_STIRLING, 3, 2, count=2) as writer:
+            writer.write([3, 3, 2, 2, 1, 1])
+        with RecordReader(path) as reader:
+            assert list(reader) == getAllFlatStirlingPermutations(3)[:2] + [[3, 3, 2, 2, 1, 1]]
+        # but only a file of the same level with enough records
+        for args in ((FLAT_STIRLING, 3, 2, 4), (FLAT_STIRLING, 3, 3, 2), (TYPE_B, 3, 0, 2)):
+            try:
+                RecordWriter(path, *args)
+                assert False
+            except ValueError:
+                pass
+        try:
+            RecordWriter(os.path.join(directory, "missing.bin"), FLAT_STIRLING, 3, 2, count=2)
+            assert False
+        except ValueError:
+            pass
+
+        # values >= 10 are stored as they are
+        with RecordWriter(path, FLAT_STIRLING, 300, 1) as writer:
+            writer.write(list(range(1, 301)))
+        with RecordReader(path) as reader:
+            assert reader.itemsize == 2
+            assert reader.getRecord(0) == list(range(1, 301))
@@ -0,0 +1,200 @@
+import ast
+import json
+import os
+import time
+from itertools import islice
+from BinaryFormat import RecordWriter
+from CompactEncoding import FLAT_STIRLING, TYPE_B
+from ParallelEnumeration import combineSummaries
+from Ranking import generateFlatStirlingPermutationsFromRank, generateTypeBPartitionsFromRank
+from TypeBBijection import typeBPartitionToReduced
+
+# Resumable enumeration of a whole level.
+#
+# Objects are handled in batches in generation order. After a batch has gone
+# through the mapper (see ParallelEnumeration.py) and, if requested, has been
+# written to a record file (see BinaryFormat.py), the position in the level is
+# just the number of objects done so far, i.e. the rank of the next object. The
+# rank and the combined summary are saved to a small JSON checkpoint file every
+# interval seconds, when the run is interrupted, and at the end. A run that
+# finds a checkpoint of the same level continues from its rank: generation
+# starts right there (see Ranking.py) and the record file is cut back to the
+# records that were done, so the output is the same as for an uninterrupted run.
+# The record file has to be the one of the checkpoint: if it is missing, holds
+# another level or has fewer records than the checkpoint, ValueError is raised
+# instead of continuing it.
+#
+# Summaries are stored with repr() and read back with ast.literal_eval(), so they
+# have to be made of numbers, strings, tuples, lists and dictionaries.
+################################################################################
+
+"""
+Returns the state saved in a checkpoint file for the level, or None if there is
+no checkpoint file. Raises ValueError for a checkpoint of a different level.
+"""
+def loadCheckpoint(path, kind, n, k):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        state = json.load(f)
+    if (state["kind"], state["n"], state["k"]) != (kind, n, k):
+        raise ValueError(f"{path} is a checkpoint of a different level")
+    state["summary"] = ast.literal_eval(state["summary"])
+    return state
+
+"""
+Saves the state to a checkpoint file, replacing the old one only once the new
+one is completely on disk.
+"""
+def saveCheckpoint(path, state):
+    saved = dict(state)
+    saved["summary"] = repr(state["summary"])
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as f:
+        json.dump(saved, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+"""
+Runs mapper over the objects given by objects_from_rank(rank) in batches, saving
+checkpoints as described at the top of the file, and returns the combined
+summary. encode turns an object into the form the record file stores.
+"""
+def reduceWithCheckpoints(kind, n, k, objects_from_rank, mapper, checkpoint_path, reducer, initial, output_path, encode, batch_size, interval):
+    state = loadCheckpoint(checkpoint_path, kind, n, k)
+    if state is None:
+        state = {"kind": kind, "n": n, "k": k, "rank": 0, "summary": initial, "done": False}
+    if state["done"]:
+        return state["summary"]
+
+    writer = None
+    if output_path is not None:
+        writer = RecordWriter(output_path, kind, n, k, count=state["rank"])
+    objects = objects_from_rank(state["rank"])
+    saved = time.monotonic()
+    try:
+        while True:
+            batch = list(islice(objects, batch_size))
+            if not batch:
+                break
+            summary = reducer(state["summary"], mapper(batch))
+            if writer is not None:
+                writer.writeAll(batch if encode is None else [encode(obj) for obj in batch])
+            state = dict(state, rank=state["rank"] + len(batch), summary=summary)
+            if time.monotonic() - saved >= interval:
+                if writer is not None:
+                    writer.sync()
+                saveCheckpoint(checkpoint_path, state)
+                saved = time.monotonic()
+        state["done"] = True
+    finally:
+        # records after state["rank"] may have been written, they are cut off
+        # when the run is continued
+        if writer is not None:
+            writer.close()
+        saveCheckpoint(checkpoint_path, state)
+    return state["summary"]
+
+"""
+Runs mapper over the flattened Stirling permutations on k[n] and returns the
+combined summary, saving a checkpoint to checkpoint_path every interval seconds
+and continuing from it if it already exists. If output_path is given, the
+permutations are written there as a record file as well.
+"""
+def reduceFlatStirlingPermutationsWithCheckpoints(n, mapper, checkpoint_path, k = 2, reducer = combineSummaries, initial = 0, output_path = None, batch_size = 1 << 14, interval = 60.0):
+    objects_from_rank = lambda rank: generateFlatStirlingPermutationsFromRank(rank, n, k)
+    return reduceWithCheckpoints(FLAT_STIRLING, n, k, objects_from_rank, mapper, checkpoint_path, reducer, initial, output_path, None, batch_size, interval)
+
+"""
+Runs mapper over the type B partitions of {-n,...,n} and returns the combined
+summary, saving a checkpoint to checkpoint_path every interval seconds and
+continuing from it if it already exists. If output_path is given, the reduced
+representations of the partitions are written there as a record file as well.
+"""
+def reduceTypeBPartitionsWithCheckpoints(n, mapper, checkpoint_path, reducer = combineSummaries, initial = 0, output_path = None, batch_size = 1 << 14, interval = 60.0):
+    objects_from_rank = lambda rank: generateTypeBPartitionsFromRank(rank, n)
+    return reduceWithCheckpoints(TYPE_B, n, 0, objects_from_rank, mapper, checkpoint_path, reducer, initial, output_path, typeBPartitionToReduced, batch_size, interval)
+
+
+if __name__ == "__main__":
+    import tempfile
+    from ParallelEnumeration import countObjects, getRunCountHistogram
+    from BinaryFormat import writeFlatStirlingPermutations
+    from StirlingCounts import countFlatStirlingPermutations, countFlatStirlingPermutationsByRunCount
+
+    # wraps a mapper so that it stops the run after calls batches
+    def interruptAfter(mapper, calls):
+        def interrupted(batch):
+            if len(seen) == calls:
+                raise KeyboardInterrupt
+            seen.append(len(batch))
+            return mapper(batch)
+        seen = []
+        return interrupted
+
+    n = 7
+    with tempfile.TemporaryDirectory() as directory:
+        checkpoint = os.path.join(directory, "checkpoint.json")
+        output = os.path.join(directory, "level.bin")
+        expected = os.path.join(directory, "expected.bin")
+        histogram = countFlatStirlingPermutationsByRunCount(n)
+        assert reduceFlatStirlingPermutationsWithCheckpoints(n, getRunCountHistogram, checkpoint, initial={}, output_path=expected, batch_size=100) == histogram
+        os.remove(checkpoint)
+
+        # every interruption loses nothing, both with and without saving
+        # checkpoints along the way
+        for interval in (0, 1000):
+            for calls in (0, 3, 10, 20):
+                try:
+                    reduceFlatStirlingPermutationsWithCheckpoints(n, interruptAfter(getRunCountHistogram, calls), checkpoint, initial={}, output_path=output, batch_size=100, interval=interval)
+                    assert False
+                except KeyboardInterrupt:
+                    pass
+            assert reduceFlatStirlingPermutationsWithCheckpoints(n, getRunCountHistogram, checkpoint, initial={}, output_path=output, batch_size=100, interval=interval) == histogram
+            with open(output, "rb") as f, open(expected, "rb") as g:
+                assert f.read() == g.read()
+            # a finished run is not repeated
+            assert reduceFlatStirlingPermutationsWithCheckpoints(n, interruptAfter(getRunCountHistogram, 0), checkpoint, initial={}) == histogram
+            os.remove(checkpoint)
+
+        # partitions of {-(n-1),...,n-1} correspond to permutations on 2[n]
+        reduceTypeBPartitionsWithCheckpoints(n - 1, countObjects, checkpoint, output_path=expected, batch_size=100)
+        os.remove(checkpoint)
+        try:
+            reduceTypeBPartitionsWithCheckpoints(n - 1, interruptAfter(countObjects, 7), checkpoint, output_path=output, batch_size=100, interval=0)
+            assert False
+        except KeyboardInterrupt:
+            pass
+        assert reduceTypeBPartitionsWithCheckpoints(n - 1, countObjects, checkpoint, output_path=output, batch_size=100) == countFlatStirlingPermutations(n)
+        with open(output, "rb") as f, open(expected, "rb") as g:
+            assert f.read() == g.read()
+
+        # a checkpoint of another level is not used
+        try:
+            reduceTypeBPartitionsWithCheckpoints(n, countObjects, checkpoint)
+            assert False
+        except ValueError:
+            pass
+
+        # the record file has to match the checkpoint
+        os.remove(checkpoint)
+        try:
+            reduceTypeBPartitionsWithCheckpoints(n - 1, interruptAfter(countObjects, 7), checkpoint, output_path=output, batch_size=100, interval=0)
+            assert False
+        except KeyboardInterrupt:
+            pass
+        with open(output, "r+b") as f:
+            f.truncate(os.path.getsize(output) - 1)
+        other = os.path.join(directory, "other.bin")
+        writeFlatStirlingPermutations(other, n)
+        for path in (output, other, os.path.join(directory, "missing.bin")):
+            try:
+                reduceTypeBPartitionsWithCheckpoints(n - 1, countObjects, checkpoint, output_path=path, batch_size=100)
+                assert False
+            except ValueError:
+                pass
+        os.remove(checkpoint)
+
+        # n = 0 has nothing to go through
+        assert reduceFlatStirlingPermutationsWithCheckpoints(0, countObjects, checkpoint) == 0
@@ -0,0 +1,179 @@
+# Compact integer codes for flattened Stirling permutations and type B
+# partitions.
+#
+# Both objects are built one value at a time, so each is described by the
+# choice made when the value i was added. The code packs those choices into a
+# single int using a fixed mixed radix that only depends on n (and k), so a
+# code can be decoded without knowing anything else about the object:
+#
+# Flattened Stirling permutations on k[n]: the digit for 2 <= i <= n is the
+# position j after which the block k * [i] was inserted into the permutation on
+# k[i-1]. It has radix k * (i-1), the length of that permutation.
+#
+# Type B partitions: the digit for 1 <= i <= n is the index of the rule that
+# added i, -i in the order used by generateTypeBPartitions: 0 for R4 (new
+# singleton blocks), 1 for R1 (the zero block), 2m for R2 and 2m+1 for R3 on the
+# m-th block pair. There are at most i-1 block pairs, so it has radix 2i.
+#
+# FLAT_STIRLING and TYPE_B tell the two kinds apart in the files of
+# LevelCache.py and BinaryFormat.py.
+################################################################################
+
+FLAT_STIRLING = 0
+TYPE_B = 1
+
+"""
+Returns a list W such that the digit for the value i of a flattened Stirling
+permutation on k[n] is worth W[i]. W[0] is the number of possible codes.
+"""
+def getFlatStirlingWeights(n, k = 2):
+    weights = (n + 1) * [0]
+    weight = 1
+    for i in range(2, n+1):
+        weights[i] = weight
+        weight *= k * (i - 1)
+    weights[0] = weight
+    return weights
+
+"""
+Returns a list W such that the digit for the value i of a type B partition of
+{-n,...,n} is worth W[i]. W[0] is the number of possible codes.
+"""
+def getTypeBWeights(n):
+    weights = (n + 1) * [0]
+    weight = 1
+    for i in range(1, n+1):
+        weights[i] = weight
+        weight *= 2 * i
+    weights[0] = weight
+    return weights
+
+"""
+Returns the code of a flattened Stirling permutation on k[n].
+"""
+def encodeFlatStirlingPermutation(perm, k = 2):
+    n = len(perm) // k
+    weights = getFlatStirlingWeights(n, k)
+    work = list(perm)
+    code = 0
+    # remove the blocks from the largest down, the first copy of i is right
+    # after the position it was inserted after
+    for i in range(n, 1, -1):
+        index = work.index(i)
+        code += (index - 1) * weights[i]
+        del work[index:index+k]
+    return code
+
+"""
+Returns the flattened Stirling permutation on k[n] with the given code.
+"""
+def decodeFlatStirlingPermutation(code, n, k = 2):
+    if n == 0:
+        return []
+    perm = k * [1]
+    for i in range(2, n+1):
+        code, j = divmod(code, k * (i - 1))
+        perm[j+1:j+1] = k * [i]
+    return perm
+
+"""
+Returns the code of a type B partition of {-n,...,n}, given as a list of
+(block, negated block) pairs with None for the zero block. Blocks can be in any
+order and any orientation.
+"""
+def encodeTypeBPartition(partition):
+    n = max([abs(x) for (b, _) in partition for x in b])
+    weights = getTypeBWeights(n)
+    # number the blocks in the order they were created, i.e. by their element
+    # with the smallest absolute value, which is also the zero block first
+    blocks = sorted([[min(b, key=abs), b] for (b, _) in partition], key=lambda x: abs(x[0]))
+    owner = (n + 1) * [None]
+    for m, (first, b) in enumerate(blocks):
+        # orient the block so that it contains +first, like R4 creates it
+        sign = 1 if first >= 0 else -1
+        for x in b:
+            owner[abs(x)] = (m, sign * x > 0)
+    code = 0
+    for i in range(1, n+1):
+        m, positive = owner[i]
+        if m == 0:
+            digit = 1
+        elif abs(blocks[m][0]) == i:
+            digit = 0
+        else:
+            digit = 2 * m if positive else 2 * m + 1
+        code += digit * weights[i]
+    return code
+
+"""
+Returns the type B partition of {-n,...,n} with the given code, in the same
+form that generateTypeBPartitions(n) produces it.
+"""
+def decodeTypeBPartition(code, n):
+    partition = [([0], None)]
+    for i in range(1, n+1):
+        code, digit = divmod(code, 2 * i)
+        if digit == 0:
+            partition.append(([i], [-i]))
+        elif digit == 1:
+            partition[0][0].extend([i, -i])
+        else:
+            b, _b = partition[digit // 2]
+            if digit % 2 == 0:
+                b.append(i)
+                _b.append(-i)
+            else:
+                b.append(-i)
+                _b.append(i)
+    return partition
+
+"""
+Returns the number of bytes needed to store any code below the given number of
+possible codes (i.e. W[0] from the weight functions above).
+"""
+def getCodeWidth(num_codes):
+    return max(1, ((num_codes - 1).bit_length() + 7) // 8)
+
+"""
+Packs the codes into bytes using width little endian bytes per code.
+"""
+def packCodes(codes, width):
+    return b"".join([code.to_bytes(width, "little") for code in codes])
+
+"""
+Lazily unpacks codes from bytes (or any buffer, e.g. an mmap) written by
+packCodes().
+"""
+def unpackCodes(data, width):
+    view = memoryview(data)
+    for start in range(0, len(view), width):
+        yield int.from_bytes(view[start:start+width], "little")
+
+
+if __name__ == "__main__":
+    from StirlingPermutations import generateFlatStirlingPermutations
+    from TypeBPartitions import generateTypeBPartitions
+
+    for k in range(1, 5):
+        for n in range(0, 7):
+            codes = list(generateFlatStirlingPermutations(n, k, encoded=True))
+            for perm, code in zip(generateFlatStirlingPermutations(n, k), codes):
+                assert encodeFlatStirlingPermutation(perm, k) == code
+                assert decodeFlatStirlingPermutation(code, n, k) == perm
+            assert len(set(codes)) == len(codes)
+            width = getCodeWidth(getFlatStirlingWeights(n, k)[0])
+            assert list(unpackCodes(packCodes(codes, width), width)) == codes
+
+    for n in range(0, 7):
+        partitions = generateTypeBPartitions(n)
+        codes = generateTypeBPartitions(n, encoded=True)
+        assert len(codes) == len(partitions) == len(set(codes))
+        for partition, code in zip(partitions, codes):
+            assert encodeTypeBPartition(partition) == code
+            assert decodeTypeBPartition(code, n) == partition
+        width = getCodeWidth(getTypeBWeights(n)[0])
+        assert list(unpackCodes(packCodes(codes, width), width)) == codes
+
+    for n in (10, 12, 20):
+        print(f"n={n}: {getCodeWidth(getFlatStirlingWeights(n)[0])} bytes per flat Stirling permutation, "
+              f"{getCodeWidth(getTypeBWeights(n)[0])} bytes per type B partition")
@@ -1,3 +1,5 @@
+from collections import OrderedDict
+
 """
 Represents an individual character along with a sign. Uses the inherent
 ordering on the type of self.char along with the implied ordering of the
@@ -38,13 +40,17 @@ gives functionality for determining if a Word is flattened (i.e. the runs are
 in weakly increasing order according to the first Letter of each run).
 self.letters -> Array of Letters that the Word represents.
 self.runs -> List of lists of Letters representing the Word broken into its run.
-            Enumerated on construction.
+            Enumerated the first time it is used.
+The number of runs and whether the Word is flattened are also computed once, on
+first use, without building the runs if they are not needed otherwise.
 """
 class Word:
 
     def __init__(self, letters):
         self.letters = letters
-        self.runs = self.getRuns()
+        self.cached_runs = None
+        self.num_runs = None
+        self.flattened = None
 
     def __str__(self):
         return "".join([str(x) for x in self.letters])
@@ -55,6 +61,12 @@ class Word:
     def __len__(self):
         return len(self.letters)
 
+    @property
+    def runs(self):
+        if self.cached_runs is None:
+            self.cached_runs = self.getRuns()
+        return self.cached_runs
+
     def getRuns(self):
         if len(self.letters) == 0:
             return []
@@ -74,15 +86,34 @@ class Word:
 
         return runs
 
+    """
+    Returns the indices where each run starts, without building the runs.
+    """
+    def getRunStarts(self):
+        letters = self.letters
+        if len(letters) == 0:
+            return []
+        return [0] + [i for i in range(1, len(letters)) if not letters[i-1] <= letters[i]]
+
     def getNumRuns(self):
-        return len(self.runs)
+        if self.num_runs is None:
+            if self.cached_runs is not None:
+                self.num_runs = len(self.cached_runs)
+            else:
+                self.num_runs = len(self.getRunStarts())
+        return self.num_runs
 
     def isFlattened(self):
-        for i in range(len(self.runs) - 1):
-            if not (self.runs[i][0] <= self.runs[i+1][0]):
-                return False
+        if self.flattened is None:
+            starts = self.getRunStarts()
+            self.num_runs = len(starts)
+            self.flattened = True
+            for i in range(len(starts) - 1):
+                if not (self.letters[starts[i]] <= self.letters[starts[i+1]]):
+                    self.flattened = False
+                    break
 
-        return True
+        return self.flattened
 
     def getRunType(self):
         return [len(run) for run in self.runs]
@@ -91,7 +122,146 @@ class Word:
 Creates a Word object given an iterable, usually a string.
 """
 def makeWord(text):
-    return Word([Letter(x) for x in text])
+    if word_cache is None:
+        return Word([Letter(x) for x in text])
+    letters = tuple(text)
+    return word_cache.get((Word, letters), lambda: Word([Letter(x) for x in letters]))
+
+"""
+Array backed version of Word for when there are many words to classify. The
+letters are stored as a tuple of signed ints, where -c stands for the Letter c
+with a negative sign, so the ordering of Letters is just the ordering of ints
+and runs are found with primitive comparisons. Positive symbols of any other
+comparable type (e.g. the characters of a string) work as well.
+Instead of a list of Letters per run, only the index where each run starts is
+stored, so building a FastWord allocates a constant number of objects.
+self.letters -> Tuple of the signed letters.
+self.starts -> List of the indices where each run starts. Found the first time
+            it is used, and whether the word is flattened is cached as well.
+"""
+class FastWord:
+    __slots__ = ("letters", "cached_starts", "flattened")
+
+    def __init__(self, letters):
+        self.letters = tuple(letters)
+        self.cached_starts = None
+        self.flattened = None
+
+    @property
+    def starts(self):
+        if self.cached_starts is None:
+            letters = self.letters
+            if len(letters) == 0:
+                self.cached_starts = []
+            else:
+                self.cached_starts = [0] + [i for i in range(1, len(letters)) if letters[i-1] > letters[i]]
+        return self.cached_starts
+
+    def __str__(self):
+        return "".join([f"(-{-x})" if isinstance(x, int) and x < 0 else str(x) for x in self.letters])
+
+    def __repr__(self):
+        return str(self)
+
+    def __len__(self):
+        return len(self.letters)
+
+    def getRuns(self):
+        ends = self.starts[1:] + [len(self.letters)]
+        return [list(self.letters[start:end]) for start, end in zip(self.starts, ends)]
+
+    def getNumRuns(self):
+        return len(self.starts)
+
+    def isFlattened(self):
+        if self.flattened is None:
+            letters = self.letters
+            starts = self.starts
+            self.flattened = True
+            for i in range(len(starts) - 1):
+                if letters[starts[i]] > letters[starts[i+1]]:
+                    self.flattened = False
+                    break
+
+        return self.flattened
+
+    def getRunType(self):
+        ends = self.starts[1:] + [len(self.letters)]
+        return [end - start for start, end in zip(self.starts, ends)]
+
+"""
+Creates a FastWord object given an iterable of signed ints or of characters.
+"""
+def makeFastWord(text):
+    if word_cache is None:
+        return FastWord(text)
+    letters = tuple(text)
+    return word_cache.get((FastWord, letters), lambda: FastWord(letters))
+
+"""
+Bounded cache from the content of a word to the Word or FastWord made from it,
+dropping the least recently used word when it is full. Since the statistics of
+a word are cached on the word, classifying the same sequence again through
+makeWord() or makeFastWord() does not redo the run scan. Cached words are shared
+between callers and must not be modified.
+self.words -> OrderedDict from (class, tuple of letters) to word, least recently
+            used first.
+self.hits, self.misses -> Number of lookups that were and were not found.
+"""
+class WordCache:
+
+    def __init__(self, maxsize = 1 << 16):
+        self.maxsize = maxsize
+        self.words = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    """
+    Returns the word stored under key, or stores and returns make() if there
+    is none.
+    """
+    def get(self, key, make):
+        word = self.words.get(key)
+        if word is not None:
+            self.hits += 1
+            self.words.move_to_end(key)
+            return word
+        self.misses += 1
+        word = make()
+        self.words[key] = word
+        if len(self.words) > self.maxsize:
+            self.words.popitem(last=False)
+        return word
+
+    def info(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.words), "maxsize": self.maxsize}
+
+    def clear(self):
+        self.words.clear()
+        self.hits = 0
+        self.misses = 0
+
+# The cache used by makeWord() and makeFastWord(), None while it is disabled.
+word_cache = None
+
+"""
+Turns on caching of makeWord() and makeFastWord() results, keeping at most
+maxsize words. Any previous cache is dropped.
+"""
+def enableWordCache(maxsize = 1 << 16):
+    global word_cache
+    word_cache = WordCache(maxsize)
+
+def disableWordCache():
+    global word_cache
+    word_cache = None
+
+"""
+Returns the hits, misses, size and maxsize of the word cache, or None if it is
+disabled.
+"""
+def getWordCacheInfo():
+    return None if word_cache is None else word_cache.info()
 
 
 if __name__ == "__main__":
@@ -128,3 +298,44 @@ if __name__ == "__main__":
     assert str(Word(flat_runs[0])) == "(-b)(-a)b"
     assert str(Word(flat_runs[1])) == "(-a)ab"
     assert str(Word(flat_runs[2])) == "a"
+
+    # the array backed words agree with the Letter based ones
+    unflat_fast = FastWord([1, -1, 2, 2, -2])
+    flat_fast = FastWord([-2, -1, 2, -1, 1, 2, 1])
+    assert str(unflat_fast) == "1(-1)22(-2)"
+    assert not unflat_fast.isFlattened()
+    assert flat_fast.isFlattened()
+    assert unflat_fast.getRuns() == [[1], [-1, 2, 2], [-2]]
+    assert flat_fast.getRunType() == [3, 3, 1]
+    for text in ["", "1", "1221", "122331", "133221", "abcab", "cbacba", "aabbaa"]:
+        word = makeWord(text)
+        fast_word = makeFastWord(text)
+        assert str(word) == str(fast_word)
+        assert [str(Word(run)) for run in word.getRuns()] == ["".join(run) for run in fast_word.getRuns()]
+        assert word.getNumRuns() == fast_word.getNumRuns()
+        assert word.isFlattened() == fast_word.isFlattened()
+        assert word.getRunType() == fast_word.getRunType()
+
+    # statistics are lazy and agree whether or not the runs were built
+    for text in ["", "1", "1221", "133221", "cbacba"]:
+        word = makeWord(text)
+        assert word.cached_runs is None
+        assert word.isFlattened() == makeFastWord(text).isFlattened()
+        assert word.cached_runs is None
+        assert word.getNumRuns() == len(word.runs)
+        assert word.runs is word.runs
+
+    # cached words are reused, and the cache stays within its bound
+    enableWordCache(maxsize=2)
+    assert makeWord("1221") is makeWord("1221")
+    assert makeFastWord([1, 2, 2, 1]) is makeFastWord((1, 2, 2, 1))
+    assert makeFastWord("1221") is not makeWord("1221")
+    makeWord("1122")
+    assert getWordCacheInfo() == {"hits": 2, "misses": 5, "size": 2, "maxsize": 2}
+    # iterators are read only once
+    assert str(makeWord(x for x in [1, 2, 2, 1])) == str(makeWord([1, 2, 2, 1])) == "1221"
+    assert makeFastWord(x for x in [1, 2, 2, 1]).letters == makeFastWord([1, 2, 2, 1]).letters
+    assert makeFastWord(iter([1, 2, 2, 1])).getNumRuns() == 2
+    disableWordCache()
+    assert getWordCacheInfo() is None
+    assert makeWord("1221") is not makeWord("1221")
@@ -0,0 +1,193 @@
+import sys
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# Opt-in instrumentation for the generators and the bijection functions.
+#
+# The instrumented functions take an optional metrics argument. When it is None
+# (the default) nothing is recorded and the only cost is a check of the argument.
+# When a Metrics object is passed in, the functions record into it:
+#   - the time, number of calls and net allocated memory blocks of named
+#     sections, e.g. "level 3" for the level by level type B construction, or
+#     "walk" (insertion points) and "build" (copying out the children) for the
+#     depth first flattened Stirling generator,
+#   - the number of nodes on every level of the generation tree and a histogram
+#     of how many children those nodes have.
+# The bijection functions, which convert one object per call, are wrapped with
+# @timed, which only times the whole call under the name of the function.
+#
+# This module is imported by the worker processes of ParallelEnumeration.py, so
+# the profiler is only imported once profileCall() is used.
+################################################################################
+
+"""
+Collects the measurements of instrumented functions.
+self.times -> Dictionary from section name to total seconds.
+self.calls -> Dictionary from section name to number of times it was timed.
+self.allocations -> Dictionary from section name to the net change in the
+            number of memory blocks allocated by the interpreter.
+self.nodes -> Dictionary from level to number of nodes on that level.
+self.children -> Dictionary from level to a dictionary from number of children
+            to the number of nodes on that level with that many children.
+self.callback -> If set, called as callback(name, seconds) every time a
+            section is timed.
+"""
+class Metrics:
+
+    def __init__(self, callback = None):
+        self.times = {}
+        self.calls = {}
+        self.allocations = {}
+        self.nodes = {}
+        self.children = {}
+        self.callback = callback
+        self.started = {}
+
+    """
+    Records count nodes on a level that have the given number of children.
+    """
+    def addNodes(self, level, children, count = 1):
+        self.nodes[level] = self.nodes.get(level, 0) + count
+        histogram = self.children.setdefault(level, {})
+        histogram[children] = histogram.get(children, 0) + count
+
+    """
+    Adds seconds (and allocated blocks) to a section without counting a call.
+    """
+    def addTime(self, name, seconds, allocations = 0):
+        self.times[name] = self.times.get(name, 0.0) + seconds
+        if allocations:
+            self.allocations[name] = self.allocations.get(name, 0) + allocations
+        if self.callback is not None:
+            self.callback(name, seconds)
+
+    def start(self, name):
+        self.started[name] = (time.perf_counter(), sys.getallocatedblocks())
+
+    def stop(self, name):
+        seconds = time.perf_counter()
+        blocks = sys.getallocatedblocks()
+        start_seconds, start_blocks = self.started.pop(name)
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.allocations[name] = self.allocations.get(name, 0)
+        self.addTime(name, seconds - start_seconds, blocks - start_blocks)
+
+    """
+    Context manager that times a section, e.g. with metrics.timer("format"): ...
+    """
+    @contextmanager
+    def timer(self, name):
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.stop(name)
+
+    def asDict(self):
+        return {
+            "times": dict(self.times),
+            "calls": dict(self.calls),
+            "allocations": dict(self.allocations),
+            "nodes": dict(self.nodes),
+            "children": {level: dict(histogram) for level, histogram in self.children.items()},
+        }
+
+    """
+    Returns the measurements as readable text.
+    """
+    def report(self):
+        lines = []
+        for name, seconds in self.times.items():
+            line = f"{name:30} {seconds:10.4f} s"
+            if name in self.calls:
+                line += f" {self.calls[name]:>10} calls"
+            if name in self.allocations:
+                line += f" {self.allocations[name]:>+12} blocks"
+            lines.append(line)
+        for level in sorted(self.nodes):
+            histogram = ", ".join([f"{children}: {count}" for children, count in sorted(self.children[level].items())])
+            lines.append(f"level {level:<4} {self.nodes[level]:>12} nodes   children {{{histogram}}}")
+        return "\n".join(lines)
+
+"""
+Decorator that adds the optional metrics argument to a function of one argument.
+If metrics is given, the call is timed in it under the name of the function.
+"""
+def timed(function):
+    name = function.__name__
+
+    @wraps(function)
+    def wrapper(argument, metrics = None):
+        if metrics is None:
+            return function(argument)
+        with metrics.timer(name):
+            return function(argument)
+    return wrapper
+
+"""
+Runs function(*args, **kwargs) under cProfile and returns its result. The stats
+are written to path if given (for pstats or snakeviz) and the top limit entries
+sorted by sort are printed if _print is set.
+"""
+def profileCall(function, *args, path = None, sort = "cumulative", limit = 25, _print = True, **kwargs):
+    import cProfile
+    import io
+    import pstats
+    profiler = cProfile.Profile()
+    result = profiler.runcall(function, *args, **kwargs)
+    if path is not None:
+        profiler.dump_stats(path)
+    if _print:
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats(sort).print_stats(limit)
+        print(stream.getvalue())
+    return result
+
+
+if __name__ == "__main__":
+    import os
+    import tempfile
+    from StirlingCounts import countFlatStirlingPermutations
+    from StirlingPermutations import getAllFlatStirlingPermutations, generateBalancedParens, buildParensDict, flattenParensDict, fillInStirlingPermutation, getTypeBPartition
+    from TypeBPartitions import generateTypeBPartitions, getReducedRepresentation, getStirlingPermutation
+    from TypeBBijection import flatStirlingToTypeB, typeBToFlatStirling, typeBPartitionToReduced, reducedToTypeBPartition
+
+    n = 6
+    for k in range(1, 4):
+        metrics = Metrics()
+        assert getAllFlatStirlingPermutations(n, k, metrics=metrics) == getAllFlatStirlingPermutations(n, k)
+        for level in range(1, n + 1):
+            assert metrics.nodes[level] == countFlatStirlingPermutations(level, k)
+            children = sum([c * count for c, count in metrics.children[level].items()])
+            assert children == (countFlatStirlingPermutations(level + 1, k) if level < n else 0)
+        assert {"walk", "build", "getAllFlatStirlingPermutations"} <= set(metrics.times)
+
+    seen = []
+    metrics = Metrics(callback=lambda name, seconds: seen.append(name))
+    assert generateTypeBPartitions(n, metrics=metrics) == generateTypeBPartitions(n)
+    assert generateTypeBPartitions(n, encoded=True, metrics=metrics) == generateTypeBPartitions(n, encoded=True)
+    assert seen == 2 * [f"level {i}" for i in range(1, n + 1)]
+    for level in range(0, n + 1):
+        assert metrics.nodes[level] == 2 * len(generateTypeBPartitions(level))
+
+    metrics = Metrics()
+    for string in generateBalancedParens(4):
+        paren_indices = flattenParensDict(buildParensDict(list(string)))
+        assert fillInStirlingPermutation(4, paren_indices, metrics=metrics) == fillInStirlingPermutation(4, paren_indices)
+    assert metrics.nodes[4] == 105
+    assert metrics.calls["fillInStirlingPermutation"] == 14
+
+    metrics = Metrics()
+    for perm in getAllFlatStirlingPermutations(5):
+        reduced = getReducedRepresentation(getTypeBPartition(perm, metrics), metrics)
+        assert getStirlingPermutation(reduced, metrics) == perm
+        assert typeBToFlatStirling(flatStirlingToTypeB(perm, metrics), metrics) == perm
+        assert reducedToTypeBPartition(typeBPartitionToReduced(getTypeBPartition(perm), metrics), metrics) == getTypeBPartition(perm)
+    assert all([metrics.calls[name] == 116 for name in ["getTypeBPartition", "getReducedRepresentation", "getStirlingPermutation", "flatStirlingToTypeB", "typeBToFlatStirling", "typeBPartitionToReduced", "reducedToTypeBPartition"]])
+    assert flatStirlingToTypeB.__name__ == "flatStirlingToTypeB"
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "profile.out")
+        assert profileCall(getAllFlatStirlingPermutations, 5, path=path, _print=False) == getAllFlatStirlingPermutations(5)
+        assert os.path.getsize(path) > 0
@@ -0,0 +1,306 @@
+import hashlib
+import mmap
+import os
+import struct
+from CompactEncoding import FLAT_STIRLING, TYPE_B, getFlatStirlingWeights, getTypeBWeights, getCodeWidth, decodeFlatStirlingPermutation, decodeTypeBPartition
+from StirlingPermutations import generateFlatStirlingPermutations, getInsertionPoints
+from TypeBPartitions import generateTypeBPartitions
+
+# Disk backed cache of whole levels, stored as the packed codes from
+# CompactEncoding in generation order.
+#
+# Every level is one file with a fixed size header followed by the codes:
+#   magic, kind, n, k, number of codes, bytes per code, sha256 of the codes
+# Files are written to a temporary name and renamed once complete, so a level
+# is either missing or whole. Opening a level only checks the header against
+# the file size, so a cache hit costs no more than mapping the file. Reading the
+# whole file back to compare the checksum is left to caches made with
+# verify=True; files that fail it were damaged after they were written and are
+# deleted and regenerated.
+################################################################################
+
+HEADER = struct.Struct("<8sBHHQB32s")
+MAGIC = b"STTBLVL1"
+CHUNK_SIZE = 1 << 16
+
+"""
+Read only, memory mapped view of the codes of one cached level. Supports len(),
+indexing and iteration, and decode(i) gives the object with index i.
+self.kind -> FLAT_STIRLING or TYPE_B.
+self.n, self.k -> The level (k is 0 for type B partitions).
+self.width -> Bytes per code.
+"""
+class CachedLevel:
+
+    def __init__(self, path, kind, n, k, count, width):
+        self.kind = kind
+        self.n = n
+        self.k = k
+        self.width = width
+        self.count = count
+        self.file = open(path, "rb")
+        if count == 0:
+            self.map = None
+            self.codes = memoryview(b"")
+        else:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.codes = memoryview(self.map)[HEADER.size:HEADER.size + count * width]
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if not -self.count <= i < self.count:
+            raise IndexError(f"code {i} out of range")
+        start = (i % self.count) * self.width
+        return int.from_bytes(self.codes[start:start + self.width], "little")
+
+    def __iter__(self):
+        width = self.width
+        codes = self.codes
+        for start in range(0, len(codes), width):
+            yield int.from_bytes(codes[start:start + width], "little")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def decode(self, i):
+        if self.kind == FLAT_STIRLING:
+            return decodeFlatStirlingPermutation(self[i], self.n, self.k)
+        return decodeTypeBPartition(self[i], self.n)
+
+    def close(self):
+        self.codes.release()
+        if self.map is not None:
+            self.map.close()
+        self.file.close()
+
+"""
+Cache of generated levels in a directory, bounded to max_bytes on disk. When
+the cache is over its size, the levels that were used least recently are
+deleted. The cache can be turned off with enabled=False or by setting the
+environment variable STIRLING_CACHE_DISABLE, in which case every level is
+generated in memory. The directory defaults to STIRLING_CACHE_DIR, or
+~/.cache/stirling-to-type-b. If verify is set, the checksum of every level is
+checked when it is opened, which reads the whole file.
+"""
+class LevelCache:
+
+    def __init__(self, directory = None, max_bytes = 1 << 30, enabled = True, verify = False):
+        if directory is None:
+            directory = os.environ.get("STIRLING_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "stirling-to-type-b"))
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = enabled and not os.environ.get("STIRLING_CACHE_DISABLE")
+        self.verify = verify
+
+    def getPath(self, kind, n, k):
+        if kind == FLAT_STIRLING:
+            return os.path.join(self.directory, f"flat-stirling-n{n}-k{k}.bin")
+        return os.path.join(self.directory, f"type-b-n{n}.bin")
+
+    """
+    Returns a CachedLevel with the codes of the flattened Stirling permutations
+    on k[n], generating and storing them first if needed.
+    """
+    def openFlatStirlingCodes(self, n, k = 2):
+        return self.openLevel(FLAT_STIRLING, n, k)
+
+    """
+    Returns a CachedLevel with the codes of the type B partitions of
+    {-n,...,n}, generating and storing them first if needed.
+    """
+    def openTypeBCodes(self, n):
+        return self.openLevel(TYPE_B, n, 0)
+
+    """
+    Returns the same list as getAllFlatStirlingPermutations(n, k).
+    """
+    def getFlatStirlingPermutations(self, n, k = 2):
+        if not self.enabled:
+            return list(generateFlatStirlingPermutations(n, k))
+        with self.openFlatStirlingCodes(n, k) as level:
+            return [decodeFlatStirlingPermutation(code, n, k) for code in level]
+
+    """
+    Returns the same list as generateTypeBPartitions(n).
+    """
+    def getTypeBPartitions(self, n):
+        if not self.enabled:
+            return generateTypeBPartitions(n)
+        with self.openTypeBCodes(n) as level:
+            return [decodeTypeBPartition(code, n) for code in level]
+
+    def openLevel(self, kind, n, k):
+        if not self.enabled:
+            raise RuntimeError("the level cache is disabled")
+        path = self.getPath(kind, n, k)
+        level = self.readLevel(path, kind, n, k)
+        if level is None:
+            self.writeLevel(path, kind, n, k, self.generateCodes(kind, n, k))
+            level = self.readLevel(path, kind, n, k)
+        # mark as recently used for eviction
+        os.utime(path)
+        return level
+
+    """
+    Returns the codes of a level, built from the cached level below it if
+    there is one and from scratch otherwise.
+    """
+    def generateCodes(self, kind, n, k):
+        below = self.readLevel(self.getPath(kind, n - 1, k), kind, n - 1, k) if n > 1 else None
+        if below is None:
+            if kind == FLAT_STIRLING:
+                return generateFlatStirlingPermutations(n, k, encoded=True)
+            return iter(generateTypeBPartitions(n, encoded=True))
+        return self.extendCodes(below, kind, n, k)
+
+    """
+    Generates the codes of level n from a cached level n-1. A child's code is
+    its parent's code plus the digit of the choice made for n, and children
+    come right after each other in the same order as in the generators.
+    """
+    def extendCodes(self, below, kind, n, k):
+        with below:
+            if kind == FLAT_STIRLING:
+                weight = getFlatStirlingWeights(n, k)[n]
+                for code in below:
+                    parent = decodeFlatStirlingPermutation(code, n - 1, k)
+                    for j in getInsertionPoints(parent):
+                        yield code + j * weight
+            else:
+                weight = getTypeBWeights(n)[n]
+                for code in below:
+                    # there are 2 children for every block, including the zero block
+                    blocks = len(decodeTypeBPartition(code, n - 1))
+                    for digit in range(2 * blocks):
+                        yield code + digit * weight
+
+    """
+    Returns a CachedLevel for the file if it exists and its header matches the
+    level and the file size, otherwise deletes any damaged file and returns None.
+    The checksum is only checked if the cache was made with verify=True.
+    """
+    def readLevel(self, path, kind, n, k):
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            header = f.read(HEADER.size)
+            valid = len(header) == HEADER.size
+            if valid:
+                magic, file_kind, file_n, file_k, count, width, digest = HEADER.unpack(header)
+                valid = (magic, file_kind, file_n, file_k) == (MAGIC, kind, n, k) and os.path.getsize(path) == HEADER.size + count * width
+            if valid and self.verify:
+                checksum = hashlib.sha256()
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    checksum.update(chunk)
+                valid = checksum.digest() == digest
+        if not valid:
+            os.remove(path)
+            return None
+        return CachedLevel(path, kind, n, k, count, width)
+
+    def writeLevel(self, path, kind, n, k, codes):
+        os.makedirs(self.directory, exist_ok=True)
+        num_codes = getFlatStirlingWeights(n, k)[0] if kind == FLAT_STIRLING else getTypeBWeights(n)[0]
+        width = getCodeWidth(num_codes)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        checksum = hashlib.sha256()
+        count = 0
+        with open(temporary, "wb") as f:
+            f.write(HEADER.size * b"\0")
+            chunk = bytearray()
+            for code in codes:
+                chunk += code.to_bytes(width, "little")
+                count += 1
+                if len(chunk) >= CHUNK_SIZE:
+                    checksum.update(chunk)
+                    f.write(chunk)
+                    chunk = bytearray()
+            checksum.update(chunk)
+            f.write(chunk)
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, kind, n, k, count, width, checksum.digest()))
+        os.replace(temporary, path)
+        self.evict(keep=path)
+
+    """
+    Deletes the least recently used levels until the cache fits in max_bytes.
+    The level at keep is never deleted.
+    """
+    def evict(self, keep = None):
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".bin"):
+                path = os.path.join(self.directory, name)
+                stat = os.stat(path)
+                files.append((stat.st_mtime, stat.st_size, path))
+        total = sum([size for (_, size, _) in files])
+        for (_, size, path) in sorted(files):
+            if total <= self.max_bytes:
+                break
+            if path != keep:
+                os.remove(path)
+                total -= size
+
+    """
+    Deletes every cached level.
+    """
+    def clear(self):
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith(".bin"):
+                    os.remove(os.path.join(self.directory, name))
+
+
+if __name__ == "__main__":
+    import tempfile
+    from StirlingPermutations import getAllFlatStirlingPermutations
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = LevelCache(directory)
+        for k in range(1, 4):
+            for n in range(1, 7):
+                # the first pass builds each level from the one below it, the
+                # second reads them back
+                for _ in range(2):
+                    assert cache.getFlatStirlingPermutations(n, k) == getAllFlatStirlingPermutations(n, k)
+        for n in range(0, 7):
+            for _ in range(2):
+                assert cache.getTypeBPartitions(n) == generateTypeBPartitions(n)
+
+        with cache.openFlatStirlingCodes(6) as level:
+            assert level.decode(-1) == getAllFlatStirlingPermutations(6)[-1]
+
+        # damaged files are regenerated: truncated ones always, changed ones
+        # when verifying
+        path = cache.getPath(TYPE_B, 6, 0)
+        with open(path, "r+b") as f:
+            f.seek(-1, os.SEEK_END)
+            f.write(b"\xff")
+        assert LevelCache(directory, verify=True).getTypeBPartitions(6) == generateTypeBPartitions(6)
+        with open(path, "r+b") as f:
+            f.truncate(os.path.getsize(path) - 1)
+        assert cache.getTypeBPartitions(6) == generateTypeBPartitions(6)
+
+    # eviction deletes the least recently used levels first, but never the new one
+    with tempfile.TemporaryDirectory() as directory:
+        cache = LevelCache(directory)
+        for n in range(1, 6):
+            cache.openFlatStirlingCodes(n).close()
+        paths = {n: cache.getPath(FLAT_STIRLING, n, 2) for n in range(1, 8)}
+        # level 1 was used last, then 5, 4, 3, 2
+        for age, n in enumerate([1, 5, 4, 3, 2]):
+            os.utime(paths[n], (1000 - age, 1000 - age))
+        size = HEADER.size + len(getAllFlatStirlingPermutations(6)) * getCodeWidth(getFlatStirlingWeights(6)[0])
+        small = LevelCache(directory, max_bytes=size + os.path.getsize(paths[1]) + os.path.getsize(paths[5]))
+        small.openFlatStirlingCodes(6).close()
+        assert sorted(os.listdir(directory)) == sorted([os.path.basename(paths[n]) for n in (1, 5, 6)])
+        LevelCache(directory, max_bytes=1).openFlatStirlingCodes(7).close()
+        assert os.listdir(directory) == [os.path.basename(paths[7])]
+
+    disabled = LevelCache(enabled=False)
+    assert disabled.getFlatStirlingPermutations(5) == getAllFlatStirlingPermutations(5)
@@ -0,0 +1,191 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from StirlingPermutations import generateFlatStirlingPermutations, getTypeBPartition
+from TypeBPartitions import generateTypeBPartitions, iterateTypeBPartitions, getReducedRepresentation, getStirlingPermutation
+from StirlingCounts import countFlatStirlingPermutations
+from TypeBCounts import getTypeBSubtreeSizes
+from FlattenedWords import makeFastWord
+
+# Map-reduce over the flattened Stirling permutations and the type B partitions
+# using a process pool.
+#
+# The generation tree is cut at a shallow split level m: every object on level m
+# is a shard, and a worker generates the subtree below its shard down to level n
+# and runs a mapper over it. Mappers turn an iterable of objects into a small
+# picklable summary (a count or a dictionary of counts), so only the summaries
+# travel back to the parent process where they are combined.
+#
+# Mappers must be defined at the top level of a module so they can be pickled.
+# Type B partitions are handed to mappers straight from iterateTypeBPartitions(),
+# so mappers have to copy any partition they want to keep.
+################################################################################
+
+"""
+Mapper that counts the objects.
+"""
+def countObjects(objects):
+    count = 0
+    for _ in objects:
+        count += 1
+    return count
+
+"""
+Mapper that counts flattened Stirling permutations by their number of runs.
+"""
+def getRunCountHistogram(perms):
+    counts = {}
+    for perm in perms:
+        runs = makeFastWord(perm).getNumRuns()
+        counts[runs] = counts.get(runs, 0) + 1
+    return counts
+
+"""
+Mapper that counts flattened Stirling permutations by their run type, using the
+same keys as getAllFlatStirlingPermutationsByRunType().
+"""
+def getRunTypeHistogram(perms):
+    counts = {}
+    for perm in perms:
+        runtype = ",".join([str(run) for run in makeFastWord(perm).getRunType()])
+        counts[runtype] = counts.get(runtype, 0) + 1
+    return counts
+
+"""
+Mapper that counts the flattened Stirling permutations that do not come back
+unchanged from their type B partition.
+"""
+def countStirlingBijectionFailures(perms):
+    failures = 0
+    for perm in perms:
+        reduced = getReducedRepresentation(getTypeBPartition(perm))
+        if getStirlingPermutation(reduced) != perm:
+            failures += 1
+    return failures
+
+"""
+Mapper that counts the type B partitions that do not come back unchanged from
+their flattened Stirling permutation.
+"""
+def countTypeBBijectionFailures(partitions):
+    failures = 0
+    for partition in partitions:
+        reduced = getReducedRepresentation(partition)
+        perm = getStirlingPermutation(reduced)
+        if getReducedRepresentation(getTypeBPartition(perm)) != reduced:
+            failures += 1
+    return failures
+
+"""
+Combines two summaries returned by a mapper. Numbers are added and dictionaries
+are merged by adding the values of equal keys.
+"""
+def combineSummaries(a, b):
+    if isinstance(a, dict):
+        combined = dict(a)
+        for key, value in b.items():
+            combined[key] = combined.get(key, 0) + value
+        return combined
+    return a + b
+
+"""
+Returns the smallest level m <= n with at least shards_per_worker objects per
+worker, where count(m) gives the number of objects on level m.
+"""
+def getSplitLevel(n, count, max_workers, shards_per_worker = 8):
+    m = min(1, n)
+    while m < n and count(m) < shards_per_worker * max_workers:
+        m += 1
+    return m
+
+"""
+Worker for one shard of the flattened Stirling permutations.
+"""
+def mapFlatStirlingShard(mapper, n, k, prefix):
+    return mapper(generateFlatStirlingPermutations(n, k, start=prefix))
+
+"""
+Worker for one shard of the type B partitions.
+"""
+def mapTypeBShard(mapper, n, prefix):
+    return mapper(iterateTypeBPartitions(n, prefix))
+
+"""
+Runs the worker over every shard in a process pool and combines the summaries
+in shard order.
+"""
+def reduceShards(worker, shards, reducer, initial, max_workers):
+    result = initial
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(worker, *shard) for shard in shards]
+        for future in futures:
+            result = reducer(result, future.result())
+    return result
+
+"""
+Runs mapper over the flattened Stirling permutations on k[n] in parallel and
+returns the combined summary. The permutations on k[split_level] are the shards,
+by default the first level with enough of them to keep every worker busy.
+Raises ValueError unless 1 <= split_level <= n.
+"""
+def reduceFlatStirlingPermutations(n, mapper, k = 2, reducer = combineSummaries, initial = 0, split_level = None, max_workers = None):
+    if split_level is not None and not 1 <= split_level <= n:
+        raise ValueError(f"split level {split_level} is not between 1 and n = {n}")
+    max_workers = max_workers or os.cpu_count()
+    if n == 0:
+        return reducer(initial, mapper([]))
+    if split_level is None:
+        split_level = getSplitLevel(n, lambda m: countFlatStirlingPermutations(m, k), max_workers)
+    shards = [(mapper, n, k, prefix) for prefix in generateFlatStirlingPermutations(split_level, k)]
+    return reduceShards(mapFlatStirlingShard, shards, reducer, initial, max_workers)
+
+"""
+Runs mapper over the type B partitions of {-n,...,n} in parallel and returns the
+combined summary. The partitions of {-split_level,...,split_level} are the
+shards, by default the first level with enough of them to keep every worker
+busy. Raises ValueError unless 0 <= split_level <= n.
+"""
+def reduceTypeBPartitions(n, mapper, reducer = combineSummaries, initial = 0, split_level = None, max_workers = None):
+    if split_level is not None and not 0 <= split_level <= n:
+        raise ValueError(f"split level {split_level} is not between 0 and n = {n}")
+    max_workers = max_workers or os.cpu_count()
+    if split_level is None:
+        split_level = getSplitLevel(n, lambda m: getTypeBSubtreeSizes(m)[m][0], max_workers)
+    shards = [(mapper, n, prefix) for prefix in generateTypeBPartitions(split_level)]
+    return reduceShards(mapTypeBShard, shards, reducer, initial, max_workers)
+
+
+if __name__ == "__main__":
+    from StirlingCounts import countFlatStirlingPermutationsByRunCount
+    from StirlingPermutations import getAllFlatStirlingPermutations, getAllFlatStirlingPermutationsByRunType
+
+    n = 7
+    assert reduceFlatStirlingPermutations(n, countObjects) == countFlatStirlingPermutations(n)
+    assert reduceFlatStirlingPermutations(n, countObjects, k=3, split_level=3) == countFlatStirlingPermutations(n, 3)
+    histogram = reduceFlatStirlingPermutations(n, getRunCountHistogram, initial={})
+    assert histogram == countFlatStirlingPermutationsByRunCount(n)
+    by_run_type = getAllFlatStirlingPermutationsByRunType(getAllFlatStirlingPermutations(n))
+    histogram = reduceFlatStirlingPermutations(n, getRunTypeHistogram, initial={})
+    assert histogram == {key: len(value) for key, value in by_run_type.items()}
+    assert reduceFlatStirlingPermutations(n, countStirlingBijectionFailures) == 0
+
+    # partitions of {-(n-1),...,n-1} correspond to permutations on 2[n]
+    assert reduceTypeBPartitions(n - 1, countObjects) == countFlatStirlingPermutations(n)
+    assert reduceTypeBPartitions(n - 1, countTypeBBijectionFailures) == 0
+    assert reduceTypeBPartitions(0, countObjects) == 1
+
+    # a split level outside the generation tree is refused
+    assert reduceTypeBPartitions(3, countObjects, split_level=0) == reduceTypeBPartitions(3, countObjects)
+    for reduce, lowest in ((reduceFlatStirlingPermutations, 1), (reduceTypeBPartitions, 0)):
+        assert reduce(3, countObjects, split_level=3) == reduce(3, countObjects)
+        for split_level in (lowest - 2, lowest - 1, 4, 5):
+            try:
+                reduce(3, countObjects, split_level=split_level)
+                assert False
+            except ValueError:
+                pass
+
+    # worker processes only import what the generators need
+    import subprocess
+    import sys
+    code = "import sys, ParallelEnumeration, Ranking; print(' '.join(sorted({'json', 'copy', 'asyncio', 'numpy'} & set(sys.modules))))"
+    assert subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.strip() == ""
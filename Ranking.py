@@ -0,0 +1,215 @@
+from itertools import islice
+from CompactEncoding import encodeFlatStirlingPermutation, getTypeBWeights, encodeTypeBPartition, decodeTypeBPartition
+from StirlingCounts import getFlatStirlingSubtreeSizes
+from TypeBCounts import getTypeBSubtreeSizes
+from StirlingPermutations import generateFlatStirlingPermutations, getInsertionPoints
+from TypeBPartitions import iterateTypeBPartitions, copyTypeBPartition, applyTypeBRule
+
+# Ranking and unranking in the order that the generators produce objects, i.e.
+# generateFlatStirlingPermutations(n, k) and generateTypeBPartitions(n). Both
+# orders are lexicographic in the sequence of child indices chosen at every
+# level, so the rank of an object is the number of objects in the subtrees of
+# all the earlier siblings along its path. Picking a uniformly random rank and
+# unranking it gives a uniformly random object.
+################################################################################
+
+"""
+Returns the position of perm in generateFlatStirlingPermutations(n, k).
+"""
+def rankFlatStirlingPermutation(perm, k = 2):
+    n = len(perm) // k
+    if n == 0:
+        raise ValueError("there are no flattened Stirling permutations on k[0]")
+    code = encodeFlatStirlingPermutation(perm, k)
+    sizes = getFlatStirlingSubtreeSizes(n, k)
+    rank = 0
+    points = list(range(k))
+    a = 0
+    for i in range(2, n+1):
+        code, j = divmod(code, k * (i - 1))
+        if j not in points:
+            raise ValueError(f"{perm} is not a flattened Stirling permutation")
+        index = points.index(j)
+        # every earlier sibling keeps the insertion points of the parent
+        rank += index * sizes[n-i][a]
+        if index == len(points) - 1:
+            points.extend(range(j + 1, j + 1 + k))
+            a += 1
+        else:
+            points[index:] = [p + k for p in points[index:]]
+    return rank
+
+"""
+Returns the flattened Stirling permutation on k[n] at position rank in
+generateFlatStirlingPermutations(n, k). sizes can be passed in to reuse the
+table of getFlatStirlingSubtreeSizes(n, k) when unranking many times.
+"""
+def unrankFlatStirlingPermutation(rank, n, k = 2, sizes = None):
+    if sizes is None:
+        sizes = getFlatStirlingSubtreeSizes(n, k)
+    if n == 0 or not 0 <= rank < sizes[n-1][0]:
+        raise IndexError(f"rank {rank} out of range for n={n}, k={k}")
+    perm = k * [1]
+    points = list(range(k))
+    a = 0
+    for i in range(2, n+1):
+        size = sizes[n-i][a]
+        last = len(points) - 1
+        if rank < last * size:
+            index, rank = divmod(rank, size)
+        else:
+            index, rank = last, rank - last * size
+        j = points[index]
+        perm[j+1:j+1] = k * [i]
+        if index == last:
+            points.extend(range(j + 1, j + 1 + k))
+            a += 1
+        else:
+            points[index:] = [p + k for p in points[index:]]
+    return perm
+
+"""
+Returns the position of partition in generateTypeBPartitions(n).
+"""
+def rankTypeBPartition(partition):
+    code = encodeTypeBPartition(partition)
+    n = max([abs(x) for (b, _) in partition for x in b])
+    sizes = getTypeBSubtreeSizes(n)
+    rank = 0
+    pairs = 0
+    for i in range(1, n+1):
+        # the digit of the code is the index of the child that was chosen
+        code, digit = divmod(code, 2 * i)
+        if digit == 0:
+            pairs += 1
+        else:
+            rank += sizes[n-i][pairs+1] + (digit - 1) * sizes[n-i][pairs]
+    return rank
+
+"""
+Returns the type B partition at position rank in generateTypeBPartitions(n).
+sizes can be passed in to reuse the table of getTypeBSubtreeSizes(n) when
+unranking many times.
+"""
+def unrankTypeBPartition(rank, n, sizes = None):
+    if sizes is None:
+        sizes = getTypeBSubtreeSizes(n)
+    if not 0 <= rank < sizes[n][0]:
+        raise IndexError(f"rank {rank} out of range for n={n}")
+    weights = getTypeBWeights(n)
+    code = 0
+    pairs = 0
+    for i in range(1, n+1):
+        first = sizes[n-i][pairs+1]
+        if rank < first:
+            pairs += 1
+            continue
+        digit, rank = divmod(rank - first, sizes[n-i][pairs])
+        code += (digit + 1) * weights[i]
+    return decodeTypeBPartition(code, n)
+
+"""
+Lazily generate the flattened Stirling permutations on k[n] from position rank
+of generateFlatStirlingPermutations(n, k) on, in the same order. The objects
+after the one at rank are the later siblings of every node on its path and
+everything below them, so nothing before rank is generated. A rank equal to the
+number of permutations gives nothing, and so does n = 0, like
+generateFlatStirlingPermutations(0, k).
+"""
+def generateFlatStirlingPermutationsFromRank(rank, n, k = 2):
+    if n == 0 or rank == getFlatStirlingSubtreeSizes(n, k)[n-1][0]:
+        return
+    perm = unrankFlatStirlingPermutation(rank, n, k)
+    code = encodeFlatStirlingPermutation(perm, k)
+    # path[i] is the ancestor of perm on k[i] and positions[i] where i was inserted
+    path = [[], k * [1]]
+    positions = [0, 0]
+    for i in range(2, n+1):
+        code, j = divmod(code, k * (i - 1))
+        path.append(path[-1][:j+1] + k * [i] + path[-1][j+1:])
+        positions.append(j)
+    yield perm
+    for i in range(n, 1, -1):
+        parent = path[i-1]
+        for j in getInsertionPoints(parent):
+            if j > positions[i]:
+                yield from generateFlatStirlingPermutations(n, k, start=parent[:j+1] + k * [i] + parent[j+1:])
+
+"""
+Lazily generate the type B partitions of {-n,...,n} from position rank of
+generateTypeBPartitions(n) on, in the same order, in the same way as
+generateFlatStirlingPermutationsFromRank(). Every partition yielded is a fresh
+copy.
+"""
+def generateTypeBPartitionsFromRank(rank, n):
+    if rank == getTypeBSubtreeSizes(n)[n][0]:
+        return
+    partition = unrankTypeBPartition(rank, n)
+    code = encodeTypeBPartition(partition)
+    # path[i] is the ancestor of partition on {-i,...,i} and rules[i] the index
+    # of the rule that added i
+    path = [[([0], None)]]
+    rules = [0]
+    for i in range(1, n+1):
+        code, index = divmod(code, 2 * i)
+        child = copyTypeBPartition(path[-1])
+        applyTypeBRule(child, i, index)
+        path.append(child)
+        rules.append(index)
+    yield partition
+    for i in range(n, 0, -1):
+        parent = path[i-1]
+        for index in range(rules[i] + 1, 2 * len(parent)):
+            sibling = copyTypeBPartition(parent)
+            applyTypeBRule(sibling, i, index)
+            for descendant in iterateTypeBPartitions(n, sibling):
+                yield copyTypeBPartition(descendant)
+
+"""
+Returns the count flattened Stirling permutations on k[n] from position rank of
+generateFlatStirlingPermutations(n, k) on, e.g. a page of the level or the work
+of one worker process.
+"""
+def getFlatStirlingPermutationBatch(rank, count, n, k = 2):
+    return list(islice(generateFlatStirlingPermutationsFromRank(rank, n, k), count))
+
+"""
+Returns the count type B partitions of {-n,...,n} from position rank of
+generateTypeBPartitions(n) on.
+"""
+def getTypeBPartitionBatch(rank, count, n):
+    return list(islice(generateTypeBPartitionsFromRank(rank, n), count))
+
+
+if __name__ == "__main__":
+    from StirlingPermutations import generateFlatStirlingPermutations
+    from TypeBPartitions import generateTypeBPartitions
+
+    for k in range(1, 5):
+        for n in range(1, 7):
+            for rank, perm in enumerate(generateFlatStirlingPermutations(n, k)):
+                assert rankFlatStirlingPermutation(perm, k) == rank
+                assert unrankFlatStirlingPermutation(rank, n, k) == perm
+
+    for n in range(0, 7):
+        for rank, partition in enumerate(generateTypeBPartitions(n)):
+            assert rankTypeBPartition(partition) == rank
+            assert unrankTypeBPartition(rank, n) == partition
+
+    # generation can start at any rank
+    for k in range(1, 4):
+        for n in range(1, 6):
+            perms = list(generateFlatStirlingPermutations(n, k))
+            for rank in range(len(perms) + 1):
+                assert list(generateFlatStirlingPermutationsFromRank(rank, n, k)) == perms[rank:]
+        assert list(generateFlatStirlingPermutationsFromRank(0, 0, k)) == []
+    for n in range(0, 5):
+        partitions = generateTypeBPartitions(n)
+        for rank in range(len(partitions) + 1):
+            assert list(generateTypeBPartitionsFromRank(rank, n)) == partitions[rank:]
+
+    n = 40
+    last = getFlatStirlingSubtreeSizes(n)[n-1][0] - 1
+    assert rankFlatStirlingPermutation(unrankFlatStirlingPermutation(last, n)) == last
+    last = getTypeBSubtreeSizes(n)[n][0] - 1
+    assert rankTypeBPartition(unrankTypeBPartition(last, n)) == last
@@ -0,0 +1,118 @@
+import random
+from StirlingCounts import getFlatStirlingSubtreeSizes
+from TypeBCounts import getTypeBSubtreeSizes
+from Ranking import unrankFlatStirlingPermutation, unrankTypeBPartition
+
+# Exact uniform sampling of flattened Stirling permutations and type B
+# partitions, for n far too large to enumerate.
+#
+# A sample is built top down along the generation tree: at every level the child
+# is chosen with probability proportional to the number of objects below it,
+# which the subtree size tables give exactly. That is the same as drawing a
+# uniform rank with exact big int arithmetic and unranking it (see Ranking.py),
+# so every object of the level is equally likely and a sample costs a polynomial
+# number of steps in n. The tables only depend on n (and k), so the batch
+# versions build them once for all samples.
+#
+# rng is anything with a randrange() method, e.g. random.Random(seed) for
+# reproducible samples.
+################################################################################
+
+"""
+Returns a uniformly random flattened Stirling permutation on k[n], one of the
+permutations of getAllFlatStirlingPermutations(n, k).
+"""
+def sampleFlatStirlingPermutation(n, k = 2, rng = random):
+    return next(sampleFlatStirlingPermutations(1, n, k, rng))
+
+"""
+Lazily generates count independent uniformly random flattened Stirling
+permutations on k[n]. Raises ValueError for n = 0, which has nothing to sample.
+"""
+def sampleFlatStirlingPermutations(count, n, k = 2, rng = random):
+    if n == 0:
+        raise ValueError(f"there are no flattened Stirling permutations for n={n}, k={k}")
+    sizes = getFlatStirlingSubtreeSizes(n, k)
+    total = sizes[n-1][0]
+    for _ in range(count):
+        yield unrankFlatStirlingPermutation(rng.randrange(total), n, k, sizes)
+
+"""
+Returns a uniformly random type B partition of {-n,...,n}, one of the partitions
+of generateTypeBPartitions(n).
+"""
+def sampleTypeBPartition(n, rng = random):
+    return next(sampleTypeBPartitions(1, n, rng))
+
+"""
+Lazily generates count independent uniformly random type B partitions of
+{-n,...,n}.
+"""
+def sampleTypeBPartitions(count, n, rng = random):
+    sizes = getTypeBSubtreeSizes(n)
+    total = sizes[n][0]
+    for _ in range(count):
+        yield unrankTypeBPartition(rng.randrange(total), n, sizes)
+
+"""
+Returns the chi-square statistic of observed counts against equal expected
+counts for each of num_outcomes outcomes. Outcomes that never came up count as 0.
+"""
+def getUniformChiSquare(observed, num_outcomes):
+    samples = sum(observed.values())
+    expected = samples / num_outcomes
+    unseen = num_outcomes - len(observed)
+    return sum([(count - expected) ** 2 / expected for count in observed.values()]) + unseen * expected
+
+"""
+Returns an approximate upper critical value of the chi-square distribution with
+df degrees of freedom, for the standard normal quantile z (3.09 is the 0.999
+quantile), using the Wilson-Hilferty approximation.
+"""
+def getChiSquareCriticalValue(df, z = 3.09):
+    return df * (1 - 2 / (9 * df) + z * (2 / (9 * df)) ** 0.5) ** 3
+
+
+if __name__ == "__main__":
+    import time
+    from StirlingPermutations import getAllFlatStirlingPermutations
+    from TypeBPartitions import generateTypeBPartitions
+    from Ranking import rankFlatStirlingPermutation, rankTypeBPartition
+
+    rng = random.Random(2024)
+
+    # compare the sample frequencies with the full enumeration
+    for n, k in ((3, 2), (5, 2), (4, 3), (6, 2)):
+        perms = getAllFlatStirlingPermutations(n, k)
+        observed = {}
+        for perm in sampleFlatStirlingPermutations(200 * len(perms), n, k, rng):
+            key = tuple(perm)
+            observed[key] = observed.get(key, 0) + 1
+        assert set(observed) <= set(map(tuple, perms))
+        assert getUniformChiSquare(observed, len(perms)) < getChiSquareCriticalValue(len(perms) - 1)
+
+    for n in (2, 4, 5):
+        partitions = generateTypeBPartitions(n)
+        observed = {}
+        for partition in sampleTypeBPartitions(200 * len(partitions), n, rng):
+            key = rankTypeBPartition(partition)
+            assert partitions[key] == partition
+            observed[key] = observed.get(key, 0) + 1
+        assert getUniformChiSquare(observed, len(partitions)) < getChiSquareCriticalValue(len(partitions) - 1)
+
+    try:
+        sampleFlatStirlingPermutation(0)
+        assert False
+    except ValueError:
+        pass
+
+    # samples at sizes that cannot be enumerated
+    for n in (30, 100):
+        start = time.perf_counter()
+        perms = list(sampleFlatStirlingPermutations(1000, n, 2, rng))
+        seconds = time.perf_counter() - start
+        assert all([sorted(perm) == sorted(2 * list(range(1, n + 1))) for perm in perms])
+        assert rankFlatStirlingPermutation(perms[0]) < getFlatStirlingSubtreeSizes(n)[n-1][0]
+        partition = sampleTypeBPartition(n, rng)
+        assert sorted([x for (b, _b) in partition for x in b + (_b or [])]) == list(range(-n, n + 1))
+        print(f"n={n}: {1000 / seconds:.0f} flat Stirling permutations per second")
@@ -0,0 +1,142 @@
+from StirlingPermutations import getAllFlatStirlingPermutations, canReachRunType
+from FlattenedWords import makeWord
+
+# Counts of flattened k-Stirling permutations that are computed without
+# generating any permutations.
+#
+# Following the insertion rules in getInsertionPoints(), a permutation on k[n]
+# with N insertion points and r runs has exactly N children on k[n+1]:
+# 1. r - 1 children come from inserting right before a descent. They keep both
+#    the N insertion points and the r runs.
+# 2. 1 child comes from appending the block at the very end. It keeps the r
+#    runs, and all k new positions become insertion points, so it has N + k.
+# 3. The other N - r children split a run in two. They have r + 1 runs and
+#    still N insertion points.
+# So the pair (N, r) is all that needs to be tracked from level to level.
+################################################################################
+
+"""
+Returns a dictionary from (number of insertion points, number of runs) to the
+number of flattened Stirling permutations on k[n] with those values.
+"""
+def getFlatStirlingStateCounts(n, k = 2):
+    if n == 0:
+        return {}
+    states = {(k, 1): 1}
+    for i in range(2, n+1):
+        new_states = {}
+        for (points, runs), count in states.items():
+            same = (points, runs)
+            new_states[same] = new_states.get(same, 0) + (runs - 1) * count
+            appended = (points + k, runs)
+            new_states[appended] = new_states.get(appended, 0) + count
+            if points > runs:
+                split = (points, runs + 1)
+                new_states[split] = new_states.get(split, 0) + (points - runs) * count
+        states = new_states
+    return states
+
+"""
+Returns a table T such that T[d][a] is the number of flattened Stirling
+permutations d levels below one with k * (a + 1) insertion points, for a + d < n.
+Only one child (appending at the end) gains insertion points, and it is always
+the last child, so T[d][a] = (k * (a + 1) - 1) * T[d-1][a] + T[d-1][a+1].
+"""
+def getFlatStirlingSubtreeSizes(n, k = 2):
+    sizes = [n * [1]]
+    for d in range(1, n):
+        previous = sizes[-1]
+        sizes.append([(k * (a + 1) - 1) * previous[a] + previous[a+1] for a in range(n - d)] + d * [0])
+    return sizes
+
+"""
+Returns the number of flattened Stirling permutations on k[n].
+"""
+def countFlatStirlingPermutations(n, k = 2):
+    return sum(getFlatStirlingStateCounts(n, k).values())
+
+"""
+Returns a dictionary from run count to the number of flattened Stirling
+permutations on k[n] with that many runs. Keys are in increasing order.
+"""
+def countFlatStirlingPermutationsByRunCount(n, k = 2):
+    counts = {}
+    for (_, runs), count in getFlatStirlingStateCounts(n, k).items():
+        counts[runs] = counts.get(runs, 0) + count
+    return {runs: counts[runs] for runs in sorted(counts)}
+
+"""
+Returns a dictionary from run type (formatted like the keys of
+getAllFlatStirlingPermutationsByRunType) to the number of flattened Stirling
+permutations on k[n] with that run type. If run_type or run_count is given, then
+only those permutations are counted.
+
+This uses the same run updates as generateFlatStirlingPermutationsByRunType,
+but only on the (length, splits) pairs of the runs, which is all that decides
+the run types further down the tree. Equal pairs are only expanded once.
+"""
+def countFlatStirlingPermutationsByRunType(n, k = 2, run_type = None, run_count = None):
+    if n == 0 or (run_type is not None and sum(run_type) != k * n):
+        return {}
+    memo = {}
+
+    def helper(runs):
+        if runs in memo:
+            return memo[runs]
+        lengths = [length for length, _ in runs]
+        remaining = n - sum(lengths) // k
+        counts = {}
+        if canReachRunType(lengths, remaining, k, run_type, run_count):
+            if remaining == 0:
+                counts[",".join([str(length) for length in lengths])] = 1
+            else:
+                last = len(runs) - 1
+                for t, (length, splits) in enumerate(runs):
+                    if t == last:
+                        splits = length - 1
+                    children = [runs[:t] + ((p + 1 + k, p), (length - p - 1, splits - p - 1)) + runs[t+1:] for p in range(splits)]
+                    children.append(runs[:t] + ((length + k, splits),) + runs[t+1:])
+                    for child in children:
+                        for key, count in helper(child).items():
+                            counts[key] = counts.get(key, 0) + count
+        memo[runs] = counts
+        return counts
+
+    return helper(((k, 0),))
+
+"""
+Returns the rows of a latex table with the number of flattened k-Stirling
+permutations for 1 <= i <= n and 2 <= j <= k.
+"""
+def getFlatStirlingCountTable(n, k):
+    rows = [" & ".join(["n\\k"] + [str(j) for j in range(2, k+1)])]
+    for i in range(1, n+1):
+        rows.append(" & ".join([str(i)] + [str(countFlatStirlingPermutations(i, j)) for j in range(2, k+1)]))
+    return rows
+
+
+if __name__ == "__main__":
+    # check the counts against brute force enumeration
+    for k in range(1, 5):
+        for n in range(0, 8 if k < 4 else 6):
+            perms = getAllFlatStirlingPermutations(n, k)
+            assert countFlatStirlingPermutations(n, k) == len(perms)
+            by_runs = {}
+            for perm in perms:
+                runs = makeWord(perm).getNumRuns()
+                by_runs[runs] = by_runs.get(runs, 0) + 1
+            assert countFlatStirlingPermutationsByRunCount(n, k) == by_runs
+            by_run_type = {}
+            for perm in perms:
+                runtype = ",".join([str(run) for run in makeWord(perm).getRunType()])
+                by_run_type[runtype] = by_run_type.get(runtype, 0) + 1
+            assert countFlatStirlingPermutationsByRunType(n, k) == by_run_type
+            for runtype, count in by_run_type.items():
+                target = [int(length) for length in runtype.split(",")]
+                assert countFlatStirlingPermutationsByRunType(n, k, target) == {runtype: count}
+            for runs, count in by_runs.items():
+                assert sum(countFlatStirlingPermutationsByRunType(n, k, run_count=runs).values()) == count
+
+    print("table:")
+    for row in getFlatStirlingCountTable(50, 5):
+        print(row)
@@ -1,11 +1,8 @@
-import json
-from copy import copy
-from functools import reduce
-from operator import concat
-from FlattenedWords import makeWord
-# uncomment this if you are using the first loop in main(), check that you are
-# not importing this file in TypeBPartitions.py
-# from TypeBPartitions import getReducedRepresentation, getStirlingPermutation
+from itertools import accumulate
+from time import perf_counter
+from FlattenedWords import makeFastWord
+from CompactEncoding import getFlatStirlingWeights, encodeFlatStirlingPermutation
+from Instrumentation import timed
 
 # Code below is my initial try at generating flattened Stirling permutations.
 # You only need to use this if you want to generate all of the Stirling
@@ -124,13 +121,19 @@ by choosing any unused i in [n] that is greater than what was chosen for the
 containing parenthesis pair (if there is one). If we make substitutions for all
 the parentheses in the string following these rules, then it is a Sterling
 permuation and we add it to the list.
+If metrics (see Instrumentation.py) is given, the call is timed and the search
+tree is recorded in it, with the number of pairs filled in as the level.
 """
-def fillInStirlingPermutation(n, flattened_indices, as_string = True):
+def fillInStirlingPermutation(n, flattened_indices, as_string = True, metrics = None):
+    if metrics is not None:
+        metrics.start("fillInStirlingPermutation")
     perms = []
     def helper(pos, pos_dict, used):
         if pos >= len(flattened_indices):
+            if metrics is not None:
+                metrics.addNodes(pos, 0)
             if as_string:
-                chars = [str(pos_dict[i]) if pos_dict[i] < 10 else f"({pos_dict})" for i in range(2 * n)]
+                chars = [str(pos_dict[i]) if pos_dict[i] < 10 else f"({pos_dict[i]})" for i in range(2 * n)]
                 perms.append("".join(chars))
             else:
                 perms.append([pos_dict[i] for i in range(2 * n)])
@@ -141,16 +144,86 @@ def fillInStirlingPermutation(n, flattened_indices, as_string = True):
         if nest_pos != None:
             old_start, old_end, _, = flattened_indices[nest_pos]
             minimum = pos_dict[old_start]
+        if metrics is not None:
+            metrics.addNodes(pos, len([i for i in choices if i > minimum]))
         for i in choices:
             if i <= minimum:
                 continue
             # choose i and try to fill in more
-            position_dict = copy(pos_dict)
+            position_dict = dict(pos_dict)
             position_dict[start] = i
             position_dict[end] = i
 
             helper(pos+1, position_dict, used + [i])
     helper(0, {}, [])
+    if metrics is not None:
+        metrics.stop("fillInStirlingPermutation")
+    return perms
+
+"""
+Same as fillInStirlingPermutation(), but only finds the flattened Stirling
+permutations. Pairs are filled in by increasing open index, so when a value is
+chosen for the pair opening at position p, every position before p is already
+known, and so is every position up to the next open parenthesis (those are all
+closing). The known prefix is checked as it grows: a descent starts a new run,
+and if its leading term is smaller than the previous one then no way of filling
+in the rest can be flat, so the branch is abandoned right there.
+
+Closing a pair that has anything inside it is always a descent, since the
+values inside are larger. So the value of such a pair is a leading term that is
+already known while the pair is open, and a branch is also abandoned as soon as
+a leading term inside the pair is larger than it. In particular two nested pairs
+that both have something inside can never be flat, since the inner one closes
+first with the larger value, and those parentheses strings are skipped without
+any search.
+"""
+def fillInFlatStirlingPermutation(n, flattened_indices, as_string = True):
+    perms = []
+    nonempty = [end > start + 1 for (start, end, _) in flattened_indices]
+    for pos, (_, _, nest_pos) in enumerate(flattened_indices):
+        if nonempty[pos] and nest_pos is not None:
+            return perms
+    perm = (2 * n) * [0]
+    used = (n + 1) * [False]
+    # positions that become known together with the open at flattened_indices[pos]
+    opens = [start for (start, _, _) in flattened_indices] + [2 * n]
+    known = [range(opens[pos], opens[pos+1]) for pos in range(len(flattened_indices))]
+    # pending is the value of the open pair with something inside it (or n + 1
+    # if there is none) and pending_end is where it closes
+    def helper(pos, last, leader, pending, pending_end):
+        if pos == n:
+            if as_string:
+                perms.append("".join([str(i) if i < 10 else f"({i})" for i in perm]))
+            else:
+                perms.append(list(perm))
+            return
+        start, end, nest_pos = flattened_indices[pos]
+        minimum = 0 if nest_pos is None else perm[flattened_indices[nest_pos][0]]
+        for i in range(max(minimum + 1, leader), n + 1):
+            if used[i]:
+                continue
+            used[i] = True
+            perm[start] = i
+            perm[end] = i
+            new_pending, new_pending_end = (i, end) if nonempty[pos] else (pending, pending_end)
+            # extend the known prefix and check the leading terms of its runs
+            new_last = last
+            new_leader = leader
+            flat = True
+            for j in known[pos]:
+                if perm[j] < new_last:
+                    if perm[j] < new_leader or perm[j] > new_pending:
+                        flat = False
+                        break
+                    new_leader = perm[j]
+                new_last = perm[j]
+                if j == new_pending_end:
+                    new_pending, new_pending_end = n + 1, None
+            if flat:
+                helper(pos+1, new_last, new_leader, new_pending, new_pending_end)
+            used[i] = False
+    # the first value starts a run as if it came after a descent
+    helper(0, n + 1, 0, n + 1, None)
     return perms
 
 """
@@ -195,7 +268,54 @@ def generateStirlingPermutations(n, as_string = True):
         all_perms.append(generateStirlingPermutation(n, string, as_string))
 
     # flatten and return the list
-    return reduce(concat, all_perms)
+    return [perm for perms in all_perms for perm in perms]
+
+"""
+Lazily generate the Stirling permutations on k[n] = {1,...,1,...,n,...,n} (each
+value k times) one at a time, without going through parentheses strings. Every
+Stirling permutation on k[n] is obtained exactly once by inserting k * [n] into
+one of the k * (n-1) + 1 gaps of a Stirling permutation on k[n-1], since nothing
+smaller can sit between the copies of the maximum.
+
+The search is depth first over a single working list: the block of i is
+inserted at slice position 0 and moved one gap to the right at every step, and
+removed again when it has been in every gap. Permutations come out in
+lexicographic order of the slice positions chosen for 2, ..., n, and every
+permutation yielded is a fresh list. For k = 2 this gives the same set as
+generateStirlingPermutations(n, False).
+"""
+def generateStirlingPermutationsByInsertion(n, k = 2):
+    perm = k * [1] if n > 0 else []
+    if n <= 1:
+        yield perm
+        return
+    blocks = [k * [i] for i in range(n + 1)]
+    position = (n + 1) * [0]
+    block = blocks[n]
+    i = 2
+    while True:
+        if i < n:
+            position[i] = 0
+            perm[0:0] = blocks[i]
+            i += 1
+            continue
+
+        yield from [perm[:t] + block + perm[t:] for t in range(len(perm) + 1)]
+
+        # backtrack to the deepest value whose block can still move right
+        i -= 1
+        while i >= 2:
+            t = position[i]
+            del perm[t:t+k]
+            if t < len(perm):
+                t += 1
+                position[i] = t
+                perm[t:t] = blocks[i]
+                break
+            i -= 1
+        else:
+            return
+        i += 1
 
 """
 Generate the Stirling Permutations on [n]_2 and sort them by run count returned
@@ -205,11 +325,11 @@ def getAllStirlingPermutationsByRunCount(n):
     perms = generateStirlingPermutations(n, False)
     counts = {}
     for perm in perms:
-        word = makeWord(perm)
+        word = makeFastWord(perm)
         runs = word.getNumRuns()
         if not runs in counts:
             counts[runs] = []
-        counts[runs].append("".join([str(letter) if not letter.sign or letter.char < 10 else f"({letter})" for letter in word.letters]))
+        counts[runs].append("".join([str(letter) if letter < 10 else f"({letter})" for letter in word.letters]))
     return counts;
 
 """
@@ -220,11 +340,11 @@ def getAllFlatStirlingPermutationsByRunCount(n):
     perms = getAllFlatStirlingPermutations(n)
     counts = {}
     for perm in perms:
-        word = makeWord(perm)
+        word = makeFastWord(perm)
         runs = word.getNumRuns()
         if not runs in counts:
             counts[runs] = []
-        counts[runs].append("".join([str(letter) if not letter.sign or letter.char < 10 else f"({letter})" for letter in word.letters]))
+        counts[runs].append("".join([str(letter) if letter < 10 else f"({letter})" for letter in word.letters]))
     return counts;
 
 """
@@ -232,10 +352,10 @@ Returns a list of flat Stirling permutations on the set 2[n].
 """
 def getAllFlatStirlingPermutations2(n):
     flats = []
-    for perm in generateStirlingPermutations(n):
-        word = makeWord(perm)
-        if word.isFlattened():
-            flats.append(str(word))
+    for string in generateBalancedParens(n):
+        # only the flat fillings of each parentheses string are searched
+        paren_indices = flattenParensDict(buildParensDict(list(string)))
+        flats += fillInFlatStirlingPermutation(n, paren_indices)
     return flats
 
 # The code below directly generates flattened Stirling permutations on 2[n]
@@ -280,8 +400,135 @@ def getInsertionPoints(perm):
     return insertion_indices
 
 """
-Recursively build the set of flattened Stirling permutations on 2[n] from the
-set of Stirling permutations on 2[n-1]. It does this by choosing where to insert
+Returns the insertion points of getInsertionPoints(perm) as gaps. The first
+entry is the slice position of the first insertion point (i.e. where the block
+starts) and every later entry is the distance from the previous slice position.
+"""
+def getInsertionGaps(perm):
+    gaps = []
+    previous = 0
+    for j in getInsertionPoints(perm):
+        gaps.append(j + 1 - previous)
+        previous = j + 1
+    return gaps
+
+"""
+Walks the tree of flattened Stirling permutations on k[1], ..., k[n-1] depth
+first and yields (perm, gaps, position, runs) for every permutation on k[n-1].
+The children of perm on k[n] are perm[:t] + k * [n] + perm[t:] for t in
+accumulate(gaps), in that order. position[i] is the slice position the block of
+i was inserted at in the permutation on k[i-1], for 2 <= i < n, and runs is the
+number of runs of perm.
+
+This is the fastest way through a level when the permutations on k[n] do not
+all have to be built, since each family of children is described without
+copying anything: there are len(gaps) children, and a child is found from perm
+and one slice position. E.g. of the children, the one appended at the end and
+the runs - 1 inserted right before a descent have runs runs, and the others have
+runs + 1 (see StirlingCounts.py), so counting the level by number of runs costs
+O(1) per family.
+
+The insertion points are never recomputed. Inserting the block of the new
+maximum at slice position t changes the gaps of the parent in one of two ways:
+1. If t is not the last insertion point, the insertion point at t moves to the
+   end of the block and every later one shifts by k. Everything before t keeps
+   its status, so only the gap at t grows by k.
+2. If the block is appended at the very end, every position of the block is
+   followed only by larger or equal values, so k gaps of 1 are appended.
+Both changes are undone when the search backtracks, so each child costs O(1)
+bookkeeping plus the insertion of its block into the single working list. Only
+that list, the gaps and one (choice, position, runs) triple per level are
+stored. The number of runs only grows when the block does not go right before a
+descent or at the end.
+
+If start is given, then only the subtree below that flattened Stirling
+permutation is walked.
+
+perm, gaps and position are the working lists of the search. They are only
+valid until the next value is requested and must not be modified, so copy them
+to keep them.
+
+If metrics (see Instrumentation.py) is given, every node of the tree and its
+number of children are recorded in it, with the length of the permutation
+divided by k as the level.
+"""
+def generateFlatStirlingFamilies(n, k = 2, start = None, metrics = None):
+    perm = k * [1] if start is None else list(start)
+    base = len(perm) // k
+    if n <= base:
+        return
+    gaps = getInsertionGaps(perm)
+    appended = k * [1]
+    blocks = [k * [i] for i in range(n)]
+    # for each value i currently in perm: index of the insertion point used,
+    # slice position of its block and index of the last insertion point
+    choice = n * [0]
+    position = n * [0]
+    last = n * [0]
+    runs = n * [0]
+    runs[base] = 1 + len([j for j in range(len(perm) - 1) if perm[j] > perm[j+1]])
+    code = encodeFlatStirlingPermutation(perm, k)
+    for i in range(2, base+1):
+        code, j = divmod(code, k * (i - 1))
+        position[i] = j + 1
+    i = base + 1
+    while True:
+        if i < n:
+            # descend into the first child
+            last[i] = len(gaps) - 1
+            if metrics is not None:
+                metrics.addNodes(i - 1, len(gaps))
+            choice[i] = 0
+            t = gaps[0]
+            position[i] = t
+            if last[i] > 0:
+                runs[i] = runs[i-1] + (perm[t-1] <= perm[t])
+                gaps[0] += k
+                perm[t:t] = blocks[i]
+            else:
+                runs[i] = runs[i-1]
+                gaps.extend(appended)
+                perm.extend(blocks[i])
+            i += 1
+            continue
+
+        if metrics is not None:
+            metrics.addNodes(n - 1, len(gaps))
+            metrics.addNodes(n, 0, len(gaps))
+        yield perm, gaps, position, runs[n-1]
+
+        # backtrack to the deepest value that still has a sibling to try
+        i -= 1
+        while i > base:
+            m = choice[i]
+            if m == last[i]:
+                del perm[-k:]
+                del gaps[-k:]
+                i -= 1
+                continue
+            t = position[i]
+            del perm[t:t+k]
+            gaps[m] -= k
+            m += 1
+            t += gaps[m]
+            choice[i] = m
+            position[i] = t
+            if m < last[i]:
+                runs[i] = runs[i-1] + (perm[t-1] <= perm[t])
+                gaps[m] += k
+                perm[t:t] = blocks[i]
+            else:
+                runs[i] = runs[i-1]
+                gaps.extend(appended)
+                perm.extend(blocks[i])
+            break
+        else:
+            return
+        i += 1
+
+"""
+Lazily generate the flattened Stirling permutations on k[n] one at a time. The
+permutations on k[n] are built from those on k[n-1] by choosing where to insert
 k * "n" based on the following rules.
 At any position i > 0:
 1. If there is a descent immediately after, you can insert. This just extends
@@ -293,25 +540,247 @@ At any position i > 0:
    next run. This ends the current run and the value at position i + 1 is the
    leading term of the new run, and has to be less than the aforementioned
    leading term for the entire permutation to be flat.
+
+The search is depth first (see generateFlatStirlingFamilies()), so memory
+depends on n and k rather than on the size of the level.
+
+Permutations come out in lexicographic order of the sequence of choices made at
+levels 2, ..., n, where the choice at each level is the index into
+getInsertionPoints() of the parent. This is the same order that the level by
+level construction produces. Every permutation yielded is a fresh list, so each
+one costs a copy of its parent. When only something about the permutations is
+needed, going through generateFlatStirlingFamilies() instead avoids building
+them, which is many times faster.
+
+If encoded is set, then the codes from CompactEncoding are yielded instead,
+without building the permutations at all. If start is given, then only the
+permutations on k[n] that are built from that flattened Stirling permutation are
+yielded.
+
+If metrics (see Instrumentation.py) is given, the generation tree is recorded in
+it, and the time spent finding the next parent ("walk") and copying out its
+children ("build") is measured, leaving out the time of the caller.
 """
-def getAllFlatStirlingPermutations(n, k = 2, as_str = False):
+def generateFlatStirlingPermutations(n, k = 2, encoded = False, start = None, metrics = None):
     if n == 0:
-        return []
-    level = [k * [1]]
-    for i in range(2, n+1):
-        new_level = []
-        for perm in level:
-            insertion_points = getInsertionPoints(perm)
-            for j in insertion_points:
-                new_level.append(perm[:j+1] + (k * [i]) + perm[j+1:])
-        level = new_level
+        return
+    if start is None:
+        start = k * [1]
+    if len(start) == k * n:
+        if metrics is not None:
+            metrics.addNodes(n, 0)
+        yield encodeFlatStirlingPermutation(start, k) if encoded else list(start)
+        return
+    if metrics is not None:
+        yield from generateFlatStirlingPermutationsTimed(n, k, encoded, start, metrics)
+        return
+    if encoded:
+        weights = getFlatStirlingWeights(n, k)
+        for _, gaps, position, _ in generateFlatStirlingFamilies(n, k, start):
+            # digits are insertion positions, i.e. slice positions minus one
+            offset = sum([(position[i] - 1) * weights[i] for i in range(2, n)]) - weights[n]
+            yield from [offset + t * weights[n] for t in accumulate(gaps)]
+        return
+    block = k * [n]
+    for perm, gaps, _, _ in generateFlatStirlingFamilies(n, k, start):
+        yield from [perm[:t] + block + perm[t:] for t in accumulate(gaps)]
+
+"""
+generateFlatStirlingPermutations() with metrics, kept apart so that the loop
+without metrics has no checks in it.
+"""
+def generateFlatStirlingPermutationsTimed(n, k, encoded, start, metrics):
+    weights = getFlatStirlingWeights(n, k)
+    block = k * [n]
+    families = generateFlatStirlingFamilies(n, k, start, metrics)
+    while True:
+        walk_start = perf_counter()
+        family = next(families, None)
+        build_start = perf_counter()
+        metrics.addTime("walk", build_start - walk_start)
+        if family is None:
+            return
+        perm, gaps, position, _ = family
+        if encoded:
+            offset = sum([(position[i] - 1) * weights[i] for i in range(2, n)]) - weights[n]
+            children = [offset + t * weights[n] for t in accumulate(gaps)]
+        else:
+            children = [perm[:t] + block + perm[t:] for t in accumulate(gaps)]
+        metrics.addTime("build", perf_counter() - build_start)
+        yield from children
 
+"""
+Returns a list of all the flattened Stirling permutations on k[n], in the order
+given by generateFlatStirlingPermutations(n, k). If as_str is set, then each
+permutation is returned as a string with values >= 10 wrapped in parentheses.
+If metrics (see Instrumentation.py) is given, the generation is measured in it,
+including the string formatting ("format").
+"""
+def getAllFlatStirlingPermutations(n, k = 2, as_str = False, metrics = None):
+    if metrics is not None:
+        with metrics.timer("getAllFlatStirlingPermutations"):
+            perms = list(generateFlatStirlingPermutations(n, k, metrics=metrics))
+            if as_str:
+                with metrics.timer("format"):
+                    perms = ["".join([str(i) if i < 10 else f"({i})" for i in perm]) for perm in perms]
+            return perms
+    perms = generateFlatStirlingPermutations(n, k)
     if not as_str:
-        return level
+        return list(perms)
 
-    return ["".join([str(i) if i < 10 else f"({i})" for i in perm]) for perm in level]
+    return ["".join([str(i) if i < 10 else f"({i})" for i in perm]) for perm in perms]
 
 
+"""
+Returns the run-length encoding of a word as a list of (value, multiplicity)
+pairs, one for every maximal block of equal consecutive values, e.g. 1221 with
+k = 2 gives [(1, 1), (2, 2), (1, 1)].
+"""
+def encodeRunLengths(perm):
+    pairs = []
+    for value in perm:
+        if pairs and pairs[-1][0] == value:
+            pairs[-1] = (value, pairs[-1][1] + 1)
+        else:
+            pairs.append((value, 1))
+    return pairs
+
+"""
+Returns the word of a run-length encoding given by encodeRunLengths().
+"""
+def decodeRunLengths(pairs):
+    perm = []
+    for value, multiplicity in pairs:
+        perm += multiplicity * [value]
+    return perm
+
+"""
+Returns, for every block b of the run-length encoding of a flattened Stirling
+permutation, the pair (inner, end) telling whether the positions inside block b
+and the position at its end are insertion points of getInsertionPoints().
+
+The positions inside a block of equal values all have the same status, since
+none of them is a descent and the next descent after each of them is the same.
+Call the value right after that descent the leader of the block. Like in
+getInsertionPoints(), the inner positions are insertion points if the block has
+no leader or its value is at most the leader, and the end if the block has no
+leader or the next value is at most the leader.
+"""
+def getRunLengthInsertionBlocks(pairs):
+    blocks = len(pairs) * [(True, True)]
+    leader = None
+    for b in range(len(pairs) - 2, -1, -1):
+        value = pairs[b][0]
+        following = pairs[b+1][0]
+        if value > following:
+            leader = following
+        if leader is not None:
+            blocks[b] = (value <= leader, following <= leader)
+    return blocks
+
+"""
+Returns the insertion points of getInsertionPoints() on the run-length encoding
+of a flattened Stirling permutation, as (b, offset) pairs meaning right after the
+first offset copies of the value of block b, in order.
+"""
+def getRunLengthInsertionPoints(pairs):
+    points = []
+    for b, (inner, end) in enumerate(getRunLengthInsertionBlocks(pairs)):
+        multiplicity = pairs[b][1]
+        if inner:
+            points.extend([(b, offset) for offset in range(1, multiplicity)])
+        if end:
+            points.append((b, multiplicity))
+    return points
+
+"""
+Lazily generate the run-length encodings (see encodeRunLengths()) of the
+flattened Stirling permutations on k[n], in the order of
+generateFlatStirlingPermutations(n, k). Use decodeRunLengths() to get the
+permutations themselves. Every encoding yielded is a fresh list.
+
+A flattened Stirling permutation on k[n] has at most 2n - 1 blocks of equal
+values whatever k is, so finding the insertion points and building the children
+of a node costs time depending on n only. The block of the new maximum is larger
+than everything else, so it never merges with its neighbours: inserting it at
+the end of a block adds one pair and inserting it inside a block splits that
+block in two around it.
+
+Like generateFlatStirlingFamilies(), the search is depth first over a single
+working encoding, with the insertion of every level undone when the search
+backtracks, so only the leaves are copied. A leaf is a list of at most 2n - 1
+pairs instead of k * n values, but building a pair costs more than copying a
+value, so this only beats generateFlatStirlingPermutations() from about k = 8
+on: by about 1.3x at n = 6, k = 10 and 4x at n = 5, k = 30. For smaller k the
+plain generator is faster.
+"""
+def generateFlatStirlingPermutationsByRunLength(n, k = 2):
+    if n == 0:
+        return
+    if n == 1:
+        yield [(1, k)]
+        return
+    block = (n, k)
+    pairs = [(1, k)]
+    # for each value i < n: its insertion points in the encoding on k[i-1], the
+    # index of the one used and the pair that was at that block before
+    points = n * [None]
+    choice = n * [0]
+    replaced = n * [None]
+    i = 2
+    while True:
+        if i < n:
+            # descend into the first child
+            points[i] = getRunLengthInsertionPoints(pairs)
+            choice[i] = 0
+            b, offset = points[i][0]
+            pair = pairs[b]
+            replaced[i] = pair
+            if offset == pair[1]:
+                pairs.insert(b + 1, (i, k))
+            else:
+                pairs[b:b+1] = [(pair[0], offset), (i, k), (pair[0], pair[1] - offset)]
+            i += 1
+            continue
+
+        # copy out the children on k[n]
+        for b, (inner, end) in enumerate(getRunLengthInsertionBlocks(pairs)):
+            pair = pairs[b]
+            value, multiplicity = pair
+            head = pairs[:b]
+            tail = pairs[b+1:]
+            if inner:
+                for offset in range(1, multiplicity):
+                    yield [*head, (value, offset), block, (value, multiplicity - offset), *tail]
+            if end:
+                yield [*head, pair, block, *tail]
+
+        # backtrack to the deepest value that still has a sibling to try
+        i -= 1
+        while i > 1:
+            m = choice[i]
+            b, offset = points[i][m]
+            pair = replaced[i]
+            if offset == pair[1]:
+                del pairs[b + 1]
+            else:
+                pairs[b:b+3] = [pair]
+            m += 1
+            if m < len(points[i]):
+                choice[i] = m
+                b, offset = points[i][m]
+                pair = pairs[b]
+                replaced[i] = pair
+                if offset == pair[1]:
+                    pairs.insert(b + 1, (i, k))
+                else:
+                    pairs[b:b+1] = [(pair[0], offset), (i, k), (pair[0], pair[1] - offset)]
+                break
+            i -= 1
+        else:
+            return
+        i += 1
+
 """
 Returns a dictionary from run type to all of the Stirling permutations on the
 set [n]_2. Dictionary values are sorted lexicographically.
@@ -319,7 +788,7 @@ set [n]_2. Dictionary values are sorted lexicographically.
 def getAllFlatStirlingPermutationsByRunType(perms):
     perms_by_run_type = {}
     for perm in perms:
-        word = makeWord(perm)
+        word = makeFastWord(perm)
         if word.isFlattened():
             runtype = ",".join([str(run) for run in word.getRunType()])
             if not runtype in perms_by_run_type:
@@ -329,6 +798,99 @@ def getAllFlatStirlingPermutationsByRunType(perms):
         perms_by_run_type[key] = sorted(val)
     return perms_by_run_type
 
+"""
+Returns False if the run lengths of a flattened Stirling permutation can not
+become the target run type (or run count) after remaining more insertions. Every
+insertion either adds k to the length of one run or splits one run in two, so
+the number of runs grows by at most one per insertion. Once there are as many
+runs as in the target, only lengths can grow, by multiples of k.
+More generally, the end of every run stays the end of a run and only moves right
+by k for every block inserted before it, so each run end has to line up with a
+later run end of the target, in order, moving by a multiple of k that does not
+decrease along the word and is at most k * remaining.
+"""
+def canReachRunType(lengths, remaining, k, run_type = None, run_count = None):
+    if run_type is not None:
+        run_count = len(run_type)
+    if run_count is not None and not len(lengths) <= run_count <= len(lengths) + remaining:
+        return False
+    if run_type is not None:
+        end = 0
+        target_end = 0
+        j = 0
+        shift = 0
+        for length in lengths[:-1]:
+            end += length
+            # find the first target run end that this run end can move to
+            while True:
+                if j == len(run_type):
+                    return False
+                target_end += run_type[j]
+                j += 1
+                if target_end - end >= shift and (target_end - end) % k == 0:
+                    break
+            shift = target_end - end
+            if shift > k * remaining:
+                return False
+    return True
+
+"""
+Lazily generate the flattened Stirling permutations on k[n] together with their
+run type (formatted like the keys of getAllFlatStirlingPermutationsByRunType),
+in the order of generateFlatStirlingPermutations(n, k).
+
+The run type is updated as blocks are inserted instead of being recomputed from
+each permutation. Inserting the block right before a descent or at the very end
+adds k to the length of that run. Inserting it after position p of a run (other
+than its last position) splits the run into p + 1 + k and the rest. For every
+run except the last one, the number of positions it can be split at is also
+tracked: after a split the first part can be split at all of its p positions
+and the second part at the ones the old run had left.
+
+If run_type (a list of run lengths) or run_count is given, then only the
+permutations with that run type or number of runs are yielded, and subtrees
+that can not reach it are skipped.
+"""
+def generateFlatStirlingPermutationsByRunType(n, k = 2, run_type = None, run_count = None):
+    if n == 0:
+        return
+    if run_type is not None and sum(run_type) != k * n:
+        return
+    perm = k * [1]
+    # [length, number of positions after the start the run can be split at]
+    runs = [[k, 0]]
+
+    def helper(i):
+        lengths = [length for length, _ in runs]
+        if not canReachRunType(lengths, n - i + 1, k, run_type, run_count):
+            return
+        if i > n:
+            yield list(perm), ",".join([str(length) for length in lengths])
+            return
+        block = k * [i]
+        start = 0
+        last = len(runs) - 1
+        for t in range(last + 1):
+            run = runs[t]
+            length = run[0]
+            splits = run[1] if t < last else length - 1
+            for p in range(splits):
+                j = start + p + 1
+                perm[j:j] = block
+                runs[t:t+1] = [[p + 1 + k, p], [length - p - 1, splits - p - 1]]
+                yield from helper(i+1)
+                runs[t:t+2] = [run]
+                del perm[j:j+k]
+            j = start + length
+            perm[j:j] = block
+            runs[t][0] += k
+            yield from helper(i+1)
+            runs[t][0] -= k
+            del perm[j:j+k]
+            start += length
+
+    yield from helper(2)
+
 """
 Find the end of an all positive block. i.e. just ii or i...i for some i with all
 numbers between i being greater than i.
@@ -412,12 +974,13 @@ def getStirlingReducedForm(perm):
 Gets the reduced form of the permutation and transforms the blocks into a type B
 partition.
 """
+@timed
 def getTypeBPartition(perm):
-    assert makeWord(perm).isFlattened()
+    assert makeFastWord(perm).isFlattened()
     blocks = getStirlingReducedForm(perm)
     partition = []
     for block in blocks:
-        part = copy(block)
+        part = list(block)
         if 0 in block:
             for item in block:
                 if item != 0:
@@ -433,7 +996,66 @@ if __name__ == "__main__":
     n = 4
     k = 5
 
+    # the insertion generator agrees with the parentheses based one
+    for i in range(0, 7):
+        perms = list(generateStirlingPermutationsByInsertion(i))
+        assert len(perms) == len(set(map(tuple, perms)))
+        assert set(map(tuple, perms)) == set(map(tuple, generateStirlingPermutations(i, False)))
+
+    # the pruned parentheses search finds the same flat permutations as insertion
+    for i in range(1, 8):
+        assert sorted(getAllFlatStirlingPermutations2(i)) == sorted(getAllFlatStirlingPermutations(i, as_str=True))
+
+    # the run-length engine agrees with the insertion generator
+    for i in range(0, 7):
+        for j in range(1, 6):
+            perms = getAllFlatStirlingPermutations(i, j)
+            encodings = list(generateFlatStirlingPermutationsByRunLength(i, j))
+            assert encodings == [encodeRunLengths(perm) for perm in perms]
+            assert [decodeRunLengths(pairs) for pairs in encodings] == perms
+            for perm in perms:
+                pairs = encodeRunLengths(perm)
+                starts = list(accumulate([multiplicity for _, multiplicity in pairs], initial=0))
+                assert [starts[b] + offset - 1 for b, offset in getRunLengthInsertionPoints(pairs)] == getInsertionPoints(perm)
+
+    # the families describe the children without building them, e.g. counting
+    # a level by number of runs only takes O(1) per parent
+    def countRunsByFamilies(families):
+        counts = {}
+        for _, gaps, _, runs in families:
+            counts[runs] = counts.get(runs, 0) + runs
+            if len(gaps) > runs:
+                counts[runs + 1] = counts.get(runs + 1, 0) + len(gaps) - runs
+        return counts
+
+    for i in range(3, 7):
+        for j in range(1, 4):
+            for start in (None, j * [1] + j * [2]):
+                by_runs = {}
+                for perm in generateFlatStirlingPermutations(i, j, start=start):
+                    runs = makeFastWord(perm).getNumRuns()
+                    by_runs[runs] = by_runs.get(runs, 0) + 1
+                assert countRunsByFamilies(generateFlatStirlingFamilies(i, j, start)) == by_runs
+    start = perf_counter()
+    counts = countRunsByFamilies(generateFlatStirlingFamilies(10))
+    seconds = perf_counter() - start
+    print(f"n=10: {sum(counts.values()) / seconds:.0f} flat Stirling permutations per second counted by runs from their families")
+
+    # the run type generator follows the insertion order, with the run types of
+    # FastWord, and its filters give exactly the matching permutations
+    for i in range(0, 7):
+        for j in range(1, 4):
+            perms = getAllFlatStirlingPermutations(i, j)
+            run_types = [",".join([str(run) for run in makeFastWord(perm).getRunType()]) for perm in perms]
+            assert list(generateFlatStirlingPermutationsByRunType(i, j)) == list(zip(perms, run_types))
+            for run_type in set(run_types):
+                target = [int(length) for length in run_type.split(",")]
+                assert list(generateFlatStirlingPermutationsByRunType(i, j, run_type=target)) == [(perm, key) for perm, key in zip(perms, run_types) if key == run_type]
+            for run_count in range(0, i + 2):
+                assert list(generateFlatStirlingPermutationsByRunType(i, j, run_count=run_count)) == [(perm, key) for perm, key in zip(perms, run_types) if len(key.split(",")) == run_count]
+
     # loop to convert all Stirling perms to partitions and back again
+    # from TypeBPartitions import getReducedRepresentation, getStirlingPermutation
     # flats = getAllFlatStirlingPermutations(n)
     # any_false = False
     # for perm in flats:
@@ -0,0 +1,170 @@
+from itertools import accumulate
+from Instrumentation import timed
+
+# Linear time versions of the bijection between flattened Stirling permutations
+# on 2[n+1] and the type B partitions of {-n,...,n}, working on plain lists of
+# ints:
+#
+#   flatStirlingToTypeB(perm)          == getReducedRepresentation(getTypeBPartition(perm))
+#   typeBToFlatStirling(reduced)       == getStirlingPermutation(reduced)
+#   typeBPartitionToReduced(partition) == getReducedRepresentation(partition)
+#   reducedToTypeBPartition(reduced)   == getTypeBPartition(typeBToFlatStirling(reduced))
+#
+# The reduced form of a flattened Stirling permutation is already the reduced
+# representation of its type B partition, so going through the partition and
+# sorting it again is not needed.
+################################################################################
+
+"""
+Returns the reduced representation of the type B partition of a flattened
+Stirling permutation, in one pass over the permutation. This follows the rules
+of getStirlingReducedForm(), but decides whether a block has negatives by
+looking up the smallest value after it instead of scanning all later descents.
+"""
+@timed
+def flatStirlingToTypeB(perm):
+    # suffix_min[i] is the smallest value at position i or later. There is a
+    # descent to something lower than perm[i] after i iff suffix_min[i+1] is
+    # lower than perm[i].
+    suffix_min = list(accumulate(reversed(perm), min))[::-1]
+
+    blocks = []
+    index = 0
+    while index < len(perm) - 1:
+        elm = perm[index]
+        if perm[index + 1] == elm:
+            if suffix_min[index + 1] >= elm:
+                # rule 3: positive singleton
+                blocks.append([elm - 1])
+                index += 2
+                continue
+            # rule 2: negatives while the pairs increase, then a positive block
+            block = [1 - elm]
+            index += 2
+            while perm[index] > elm:
+                elm = perm[index]
+                block.append(1 - elm)
+                index += 2
+            elm = perm[index]
+        else:
+            block = []
+        # rule 1 (and the end of rule 2): pairs of larger values nested in elm
+        block.append(elm - 1)
+        index += 1
+        while perm[index] != elm:
+            block.append(perm[index] - 1)
+            index += 2
+        blocks.append(block)
+        index += 1
+    return blocks
+
+"""
+Returns the flattened Stirling permutation of a reduced type B partition, like
+getStirlingPermutation().
+"""
+@timed
+def typeBToFlatStirling(reduced):
+    perm = []
+    for part in reduced:
+        pos = 0
+        while part[pos] < 0:
+            # negatives present => duplicate negatives
+            perm += (1 - part[pos], 1 - part[pos])
+            pos += 1
+        first = part[pos] + 1
+        # nest any other positives in the first one
+        perm.append(first)
+        for i in range(pos + 1, len(part)):
+            perm += (part[i] + 1, part[i] + 1)
+        perm.append(first)
+    return perm
+
+"""
+Returns the reduced representation of a type B partition given as (block,
+negated block) pairs, like getReducedRepresentation(). Instead of sorting, every
+absolute value is looked up once in increasing order, which puts the blocks in
+order of their smallest absolute value and the elements of each block in order.
+"""
+@timed
+def typeBPartitionToReduced(partition):
+    n = max([abs(x) for (b, _) in partition for x in b])
+    # owner[|x|] = (pair index, sign of x in the block that is kept)
+    owner = (n + 1) * [None]
+    for index, (b, _b) in enumerate(partition):
+        if _b is None:
+            for x in b:
+                if x >= 0:
+                    owner[x] = (index, 1)
+        else:
+            # keep the block of the pair whose smallest absolute value is positive
+            sign = 1 if min(b, key=abs) > 0 else -1
+            for x in b:
+                owner[abs(x)] = (index, 1 if sign * x > 0 else -1)
+
+    reduced = []
+    block_of = len(partition) * [None]
+    for value in range(n + 1):
+        index, sign = owner[value]
+        if block_of[index] is None:
+            block_of[index] = ([], [])
+            reduced.append(block_of[index])
+        if sign < 0:
+            block_of[index][0].append(-value)
+        else:
+            block_of[index][1].append(value)
+    return [negatives + positives for (negatives, positives) in reduced]
+
+"""
+Returns the type B partition of a reduced representation as (block, negated
+block) pairs, in the form getTypeBPartition() returns it.
+"""
+@timed
+def reducedToTypeBPartition(reduced):
+    partition = []
+    for block in reduced:
+        if block[0] == 0:
+            partition.append((block + [-x for x in block if x != 0], None))
+        else:
+            partition.append((list(block), [-x for x in block]))
+    return partition
+
+"""
+Converts a whole level of flattened Stirling permutations (any iterable) to
+their reduced type B partitions.
+"""
+def flatStirlingToTypeBBatch(perms):
+    return [flatStirlingToTypeB(perm) for perm in perms]
+
+"""
+Converts a whole level of reduced type B partitions (any iterable) to their
+flattened Stirling permutations.
+"""
+def typeBToFlatStirlingBatch(reduced_partitions):
+    return [typeBToFlatStirling(reduced) for reduced in reduced_partitions]
+
+"""
+Converts a whole level of type B partitions (any iterable of (block, negated
+block) pairs) to their reduced representations.
+"""
+def typeBPartitionToReducedBatch(partitions):
+    return [typeBPartitionToReduced(partition) for partition in partitions]
+
+
+if __name__ == "__main__":
+    from StirlingPermutations import getAllFlatStirlingPermutations, getTypeBPartition
+    from TypeBPartitions import generateTypeBPartitions, getReducedRepresentation, getStirlingPermutation
+
+    for n in range(1, 8):
+        perms = getAllFlatStirlingPermutations(n)
+        reduced = flatStirlingToTypeBBatch(perms)
+        for perm, red in zip(perms, reduced):
+            assert red == getReducedRepresentation(getTypeBPartition(perm))
+            assert reducedToTypeBPartition(red) == getTypeBPartition(perm)
+        assert typeBToFlatStirlingBatch(reduced) == perms
+
+        partitions = generateTypeBPartitions(n - 1)
+        reduced = typeBPartitionToReducedBatch(partitions)
+        for partition, red in zip(partitions, reduced):
+            assert red == getReducedRepresentation(partition)
+            assert typeBToFlatStirling(red) == getStirlingPermutation(red)
+            assert flatStirlingToTypeB(typeBToFlatStirling(red)) == red
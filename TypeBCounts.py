@@ -0,0 +1,155 @@
+from math import comb
+
+# Counts of type B partitions that are computed without generating any
+# partitions.
+#
+# Following the rules of getTypeBChildren(), a partition of {-(i-1),...,i-1} with
+# b block pairs (besides the zero block) and z pairs i, -i in its zero block has
+# 2b + 2 children on {-i,...,i}:
+# R1. 1 child adds i, -i to the zero block, so it has b block pairs and z + 1.
+# R2. b children add i, -i to one of the block pairs b, -b. They keep b and z.
+# R3. b children add -i, i to one of the block pairs b, -b. They keep b and z.
+# R4. 1 child adds the block pair {i}, {-i}, so it has b + 1 and z.
+# So the pair (b, z) is all that needs to be tracked from level to level, and
+# the counts are exact integers however large they get.
+#
+# Summing over z, a partition with b block pairs has one child with b + 1 and
+# 2b + 1 with b, which is all that the sizes of the subtrees of the generation
+# tree depend on (see getTypeBSubtreeSizes(), used by Ranking.py and
+# Sampling.py).
+#
+# The counts also have a closed form: choose the z values of the zero block,
+# split the other n - z values into b blocks in S(n - z, b) ways, where S is a
+# Stirling number of the second kind, and pick the signs of every block but its
+# smallest value, which the block pair does not tell apart:
+#     C(n, z) * 2^(n - z - b) * S(n - z, b).
+################################################################################
+
+"""
+Returns a table T such that T[b][z] is the number of type B partitions of
+{-n,...,n} with b block pairs and z pairs i, -i in the zero block (so the zero
+block has 2z + 1 elements), for b + z <= n.
+"""
+def getTypeBStateTable(n):
+    table = [[1]]
+    for i in range(1, n+1):
+        new_table = [(i + 1 - b) * [0] for b in range(i + 1)]
+        for b, row in enumerate(table):
+            for z, count in enumerate(row):
+                if count == 0:
+                    continue
+                # R2 and R3 keep the state
+                new_table[b][z] += 2 * b * count
+                # R1 grows the zero block
+                new_table[b][z+1] += count
+                # R4 adds a block pair
+                new_table[b+1][z] += count
+        table = new_table
+    return table
+
+"""
+Returns a dictionary from (number of block pairs, number of pairs in the zero
+block) to the number of type B partitions of {-n,...,n} with those values, like
+getTypeBStateTable() but without the zero entries.
+"""
+def getTypeBStateCounts(n):
+    return {(b, z): count for b, row in enumerate(getTypeBStateTable(n)) for z, count in enumerate(row) if count}
+
+"""
+Returns the number of type B partitions of {-n,...,n}.
+"""
+def countTypeBPartitions(n):
+    return sum([sum(row) for row in getTypeBStateTable(n)])
+
+"""
+Returns a dictionary from number of block pairs to the number of type B
+partitions of {-n,...,n} with that many block pairs. Keys are in increasing
+order.
+"""
+def countTypeBPartitionsByBlockPairs(n):
+    return {b: sum(row) for b, row in enumerate(getTypeBStateTable(n)) if sum(row)}
+
+"""
+Returns a dictionary from the number of pairs i, -i in the zero block to the
+number of type B partitions of {-n,...,n} with that many. Keys are in increasing
+order.
+"""
+def countTypeBPartitionsByZeroBlock(n):
+    counts = {}
+    for row in getTypeBStateTable(n):
+        for z, count in enumerate(row):
+            if count:
+                counts[z] = counts.get(z, 0) + count
+    return dict(sorted(counts.items()))
+
+"""
+Returns a table S such that S[m][j] is the Stirling number of the second kind,
+the number of partitions of an m element set into j blocks, for j <= m <= n.
+"""
+def getStirlingNumbersOfSecondKind(n):
+    numbers = [[1]]
+    for m in range(1, n+1):
+        previous = numbers[-1] + [0]
+        numbers.append([0] + [j * previous[j] + previous[j-1] for j in range(1, m + 1)])
+    return numbers
+
+"""
+Returns the number of type B partitions of {-n,...,n} with b block pairs and z
+pairs in the zero block from the closed form at the top of the file. stirling
+can be passed in to reuse the table of getStirlingNumbersOfSecondKind(n).
+"""
+def countTypeBPartitionsClosedForm(n, b, z, stirling = None):
+    if b < 0 or z < 0 or b + z > n:
+        return 0
+    if stirling is None:
+        stirling = getStirlingNumbersOfSecondKind(n)
+    return comb(n, z) * 2 ** (n - z - b) * stirling[n - z][b]
+
+"""
+Returns a table T such that T[d][b] is the number of type B partitions d levels
+below one with b block pairs, for b + d <= n. R4 adds a block pair and the other
+2b + 1 rules do not, so T[d][b] = T[d-1][b+1] + (2b + 1) * T[d-1][b].
+"""
+def getTypeBSubtreeSizes(n):
+    sizes = [(n + 1) * [1]]
+    for d in range(1, n+1):
+        previous = sizes[-1]
+        sizes.append([previous[b+1] + (2 * b + 1) * previous[b] for b in range(n + 1 - d)] + d * [0])
+    return sizes
+
+
+if __name__ == "__main__":
+    import time
+    from TypeBPartitions import generateTypeBPartitions, iterateTypeBPartitions
+
+    # check the counts against brute force enumeration
+    for n in range(0, 8):
+        counts = {}
+        for partition in iterateTypeBPartitions(n):
+            key = (len(partition) - 1, (len(partition[0][0]) - 1) // 2)
+            counts[key] = counts.get(key, 0) + 1
+        assert getTypeBStateCounts(n) == counts
+        by_block_pairs = {}
+        by_zero_block = {}
+        for (b, z), count in counts.items():
+            by_block_pairs[b] = by_block_pairs.get(b, 0) + count
+            by_zero_block[z] = by_zero_block.get(z, 0) + count
+        assert countTypeBPartitionsByBlockPairs(n) == by_block_pairs
+        assert countTypeBPartitionsByZeroBlock(n) == dict(sorted(by_zero_block.items()))
+        assert countTypeBPartitions(n) == sum(counts.values()) == getTypeBSubtreeSizes(n)[n][0]
+        if n < 6:
+            assert countTypeBPartitions(n) == len(generateTypeBPartitions(n))
+
+    # the dynamic program agrees with the closed form and the subtree sizes far
+    # beyond what can be enumerated
+    start = time.perf_counter()
+    n = 200
+    table = getTypeBStateTable(n)
+    seconds = time.perf_counter() - start
+    stirling = getStirlingNumbersOfSecondKind(n)
+    for b in range(n + 1):
+        for z in range(n + 1 - b):
+            assert table[b][z] == countTypeBPartitionsClosedForm(n, b, z, stirling)
+    total = sum([sum(row) for row in table])
+    assert total == getTypeBSubtreeSizes(n)[n][0]
+    print(f"n={n}: {len(str(total))} digit number of type B partitions, split by block statistics in {seconds:.2f} s")
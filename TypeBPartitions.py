@@ -1,37 +1,168 @@
 from functools import cmp_to_key
-# uncomment this if you are using the first loop in main(), check that you are
-# not importing this file in StirlingPermutation.py
-from StirlingPermutations import getStirlingReducedForm, getTypeBPartition
+from CompactEncoding import getTypeBWeights
+from Instrumentation import timed
 """
 Generate all type B partitions on the set {-n,...,0,...,n}. A partition is type
 B if (1) for every block B in the partition, -B is also in the partition and (2)
 there is exactly one zero block B_0, s.t. B_0 = -B_0.
+If encoded is set, then a list of the codes from CompactEncoding is returned
+instead, in the same order, without building the partitions.
+If metrics (see Instrumentation.py) is given, every level is timed in it as
+"level i", and the nodes of every level and their number of children (two per
+block pair, counting the zero block as a pair, or none on level n) are recorded.
 """
-def generateTypeBPartitions(n, _print = False):
+def generateTypeBPartitions(n, _print = False, encoded = False, metrics = None):
+    if encoded:
+        weights = getTypeBWeights(n)
+        # only the code and the number of block pairs are needed per partition
+        level = [(0, 0)]
+        for i in range(1, n+1):
+            if metrics is not None:
+                metrics.start(f"level {i}")
+            new_level = []
+            for code, pairs in level:
+                # R4 is digit 0, then R1, then R2 and R3 for every block pair
+                new_level.append((code, pairs + 1))
+                for digit in range(1, 2 * pairs + 2):
+                    new_level.append((code + digit * weights[i], pairs))
+            if metrics is not None:
+                metrics.stop(f"level {i}")
+                for _, pairs in level:
+                    metrics.addNodes(i - 1, 2 * pairs + 2)
+            level = new_level
+        if metrics is not None:
+            metrics.addNodes(n, 0, len(level))
+        return [code for code, _ in level]
     level = [[([0], None)]]
     for i in range(1, n+1):
+        if metrics is not None:
+            metrics.start(f"level {i}")
         # generate next level by appending i, -i into each previous partition
         new_level = []
         for partition in level:
-            0 if not _print else print(f"{partition} generates the following:")
-            # fourth rule: add {i}, {-i} singleton blocks
-            new_level.append(partition + [([i], [-i])])
-            0 if not _print else print(f"\t R4: {new_level[-1]}")
-            for j in range(len(partition)):
-                # first rule: increase size of the zero block
-                if partition[j][1] == None:
-                    new_level.append([(b + [i, -i], _b) if _b is None else (b, _b) for (b, _b) in partition])
-                    0 if not _print else print(f"\t R1: {new_level[-1]}")
-                else:
-                    # second rule: add i, -i to blocks  b, -b respectively
-                    new_level.append([(partition[k][0], partition[k][1]) if k!=j else (partition[k][0] + [i], partition[k][1] + [-i]) for k in range(len(partition))])
-                    0 if not _print else print(f"\t R2: {new_level[-1]}")
-                    # third rule: add -i, i to blocks b, -b respectively
-                    new_level.append([(partition[k][0], partition[k][1]) if k!=j else (partition[k][0] + [-i], partition[k][1] + [i]) for k in range(len(partition))])
-                    0 if not _print else print(f"\t R3: {new_level[-1]}")
+            new_level += getTypeBChildren(partition, i, _print)
+        if metrics is not None:
+            metrics.stop(f"level {i}")
+            for partition in level:
+                metrics.addNodes(i - 1, 2 * len(partition))
         level = new_level
+    if metrics is not None:
+        metrics.addNodes(n, 0, len(level))
     return level
 
+"""
+Returns the partitions created by adding i, -i to a type B partition of
+{-(i-1),...,i-1}, in the order the rules are applied by generateTypeBPartitions.
+"""
+def getTypeBChildren(partition, i, _print = False):
+    children = []
+    0 if not _print else print(f"{partition} generates the following:")
+    # fourth rule: add {i}, {-i} singleton blocks
+    children.append(partition + [([i], [-i])])
+    0 if not _print else print(f"\t R4: {children[-1]}")
+    for j in range(len(partition)):
+        # first rule: increase size of the zero block
+        if partition[j][1] == None:
+            children.append([(b + [i, -i], _b) if _b is None else (b, _b) for (b, _b) in partition])
+            0 if not _print else print(f"\t R1: {children[-1]}")
+        else:
+            # second rule: add i, -i to blocks  b, -b respectively
+            children.append([(partition[k][0], partition[k][1]) if k!=j else (partition[k][0] + [i], partition[k][1] + [-i]) for k in range(len(partition))])
+            0 if not _print else print(f"\t R2: {children[-1]}")
+            # third rule: add -i, i to blocks b, -b respectively
+            children.append([(partition[k][0], partition[k][1]) if k!=j else (partition[k][0] + [-i], partition[k][1] + [i]) for k in range(len(partition))])
+            0 if not _print else print(f"\t R3: {children[-1]}")
+    return children
+
+"""
+Returns a copy of a type B partition that shares no lists with it.
+"""
+def copyTypeBPartition(partition):
+    return [(list(b), None if _b is None else list(_b)) for (b, _b) in partition]
+
+"""
+Applies (undo = False) or removes (undo = True) the rule with the given child
+index to add i, -i to the partition in place. The child indices follow the order
+of getTypeBChildren(): 0 is R4, 1 is R1 and 2m, 2m + 1 are R2, R3 on the m-th
+block pair, with the zero block first.
+"""
+def applyTypeBRule(partition, i, index, undo = False):
+    if index == 0:
+        # fourth rule: add {i}, {-i} singleton blocks
+        if undo:
+            partition.pop()
+        else:
+            partition.append(([i], [-i]))
+    elif index == 1:
+        # first rule: increase size of the zero block
+        if undo:
+            del partition[0][0][-2:]
+        else:
+            partition[0][0].extend((i, -i))
+    else:
+        b, _b = partition[index // 2]
+        if undo:
+            b.pop()
+            _b.pop()
+        elif index % 2 == 0:
+            # second rule: add i, -i to blocks  b, -b respectively
+            b.append(i)
+            _b.append(-i)
+        else:
+            # third rule: add -i, i to blocks b, -b respectively
+            b.append(-i)
+            _b.append(i)
+
+"""
+Lazily generate the type B partitions of {-n,...,n} in the order of
+generateTypeBPartitions(n). If start is given (a partition of {-m,...,m}, m <= n,
+with the zero block first, like generateTypeBPartitions(m) makes them), then
+only the partitions built from it are generated.
+
+This is a depth first search over a single working partition: every rule is
+applied in place, the subtree below it is generated, and the rule is undone
+again. Each step only appends or pops a few elements, so there is no copying and
+memory stays O(n). The partition that is yielded is the working partition
+itself, so it is only valid until the next one is requested and must not be
+modified. Use copyTypeBPartition() to keep it.
+"""
+def iterateTypeBPartitions(n, start = None):
+    partition = [([0], None)] if start is None else copyTypeBPartition(start)
+    m = max([abs(x) for (b, _) in partition for x in b])
+    # index of the rule applied for every value i > m currently in partition
+    rule = (n + 1) * [0]
+    i = m
+    while True:
+        if i < n:
+            # descend into the first child
+            i += 1
+            rule[i] = 0
+            applyTypeBRule(partition, i, 0)
+            continue
+
+        yield partition
+
+        # backtrack to the deepest value that still has a rule to try
+        while i > m:
+            applyTypeBRule(partition, i, rule[i], undo=True)
+            # the parent has 2 children for every block
+            if rule[i] + 1 < 2 * len(partition):
+                rule[i] += 1
+                applyTypeBRule(partition, i, rule[i])
+                break
+            i -= 1
+        else:
+            return
+
+"""
+Calls visit(partition) for every type B partition of {-n,...,n} (built from
+start, if given) without keeping any of them. The same rules as for
+iterateTypeBPartitions() apply to the partition passed to visit.
+"""
+def visitTypeBPartitions(n, visit, start = None):
+    for partition in iterateTypeBPartitions(n, start):
+        visit(partition)
+
 """
 Comparator for sorting the partition blocks. Order by absolute value, and if the
 values match let the negative value come first.
@@ -56,6 +187,7 @@ drop all the negative elements. We return the remaining blocks with the
 negatives sorted by absolute value first, then the positives sorted normally.
 Blocks are sorted by their minimal nonnegative element.
 """
+@timed
 def getReducedRepresentation(partition):
     ordered_parts = []
     # find the block from each pair we'll keep
@@ -92,6 +224,7 @@ partition. It does this by the following algorithm
        3. If there is just one positive, duplicate it.
     3. Append the subwords together to have the final Stirling permutation.
 """
+@timed
 def getStirlingPermutation(reduced_partition):
     perm = []
     for part in reduced_partition:
@@ -134,6 +267,8 @@ def getStirlingPermutation(reduced_partition):
 
 
 if __name__ == "__main__":
+    from StirlingPermutations import getStirlingReducedForm, getTypeBPartition
+
     n = 3
     # loop to convert all partitions to Stirling perms and back again
     partitions = generateTypeBPartitions(n)
@@ -146,7 +281,7 @@ if __name__ == "__main__":
         stirling_reduced = getStirlingReducedForm(gen_stirling)
         s_red_str = "|".join(["".join([str(i) if 0 <= i < 10 else f"({i})" for i in block]) for block in stirling_reduced])
         r_partition = getTypeBPartition(gen_stirling)
-        r_part_red = getReducedRepresentation(partition)
+        r_part_red = getReducedRepresentation(r_partition)
         equals = partition_reduced == r_part_red
         print(partition, "->", s_red_str, "->", gen_stirling_str, "->", s_red_str, "->", r_partition)
         any_false = any_false or not equals